@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from accounts.models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'sent_at']
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
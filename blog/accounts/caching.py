@@ -0,0 +1,93 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+
+USER_KEY = 'accounts:user:{}'
+
+
+class LocalCache:
+    """
+    LRU в памяти процесса с коротким временем жизни записей. Другие
+    процессы о сбросе не узнают, поэтому TTL ограничивает, сколько
+    они могут отдавать устаревшие данные.
+    """
+
+    def __init__(self, size_setting, ttl_setting):
+        self.size_setting = size_setting
+        self.ttl_setting = ttl_setting
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        size = getattr(settings, self.size_setting, 1000)
+        ttl = getattr(settings, self.ttl_setting, 5)
+        if not size or not ttl:
+            return
+        with self.lock:
+            self.items[key] = (copy.deepcopy(value), time.monotonic() + ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_sessions = LocalCache('AUTH_LOCAL_CACHE_SIZE', 'AUTH_LOCAL_CACHE_TTL')
+local_users = LocalCache('AUTH_LOCAL_CACHE_SIZE', 'AUTH_LOCAL_CACHE_TTL')
+
+
+def get_user(user_id):
+    """
+    Пользователь по id: из памяти процесса, затем из общего кэша,
+    затем из базы. None, если такого пользователя нет. Кэш в памяти
+    процесса (CACHE_SHARED выключен) вторым слоем не используется:
+    сброс из другого процесса до него не дойдёт.
+    """
+    key = USER_KEY.format(user_id)
+    user = local_users.get(key)
+    if user is None:
+        shared = getattr(settings, 'CACHE_SHARED', False)
+        user = cache.get(key) if shared else None
+        if user is None:
+            user = User._default_manager.filter(pk=user_id).first()
+            if user is None:
+                return None
+            if shared:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        local_users.set(key, user)
+    return user
+
+
+def forget_user(user_id):
+    key = USER_KEY.format(user_id)
+    local_users.delete(key)
+    cache.delete(key)
+
+
+def forget_session(session_key):
+    if session_key:
+        local_sessions.delete(session_key)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import tokens
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные токены активации и неактивированных пользователей ' \
+           'пачками, каждая в своей короткой транзакции'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Пауза между пачками, секунд: даёт пройти другим записям')
+
+    def handle(self, *args, **options):
+        total_users = total_tokens = 0
+        while True:
+            users, purged = tokens.purge_expired(options['batch_size'])
+            if not purged:
+                break
+            total_users += users
+            total_tokens += purged
+            self.stdout.write('{} tokens, {} users purged'.format(total_tokens, total_users))
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS('Purged {} tokens and {} users.'.format(total_tokens, total_users)))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из outbox пачками через одно SMTP-соединение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--backoff', type=int, default=60,
+                            help='Пауза перед первой повторной попыткой, секунд; дальше удваивается')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза между проверками пустого outbox, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='Отправить всё, что готово к отправке, и выйти')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.send_pending(options['batch_size'], options['max_attempts'],
+                                               options['backoff'])
+            if sent or failed:
+                self.stdout.write('sent: {}, failed: {}'.format(sent, failed))
+            if options['once']:
+                if not (sent or failed) or not outbox.has_due():
+                    break
+                continue
+            if not (sent or failed):
+                time.sleep(options['interval'])
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.5 on 2026-10-18 02:37
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='token',
+            name='token',
+            field=models.UUIDField(default=uuid.uuid4, unique=True, verbose_name='Token'),
+        ),
+    ]
@@ -1,11 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from uuid import uuid4
 
 
+EMAIL_PENDING = 'pending'
+EMAIL_SENT = 'sent'
+EMAIL_FAILED = 'failed'
+EMAIL_STATUSES = (
+    (EMAIL_PENDING, 'Pending'),
+    (EMAIL_SENT, 'Sent'),
+    (EMAIL_FAILED, 'Failed')
+)
+
+
+def get_token_ttl():
+    return timedelta(seconds=getattr(settings, 'ACTIVATION_TOKEN_TTL', 60 * 60 * 24 * 3))
+
+
+class TokenQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(created_at__gt=timezone.now() - get_token_ttl())
+
+    def expired(self):
+        return self.filter(created_at__lte=timezone.now() - get_token_ttl())
+
+
 class Token(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE,
                              verbose_name='user', related_name='registration_tokens')
-    token = models.UUIDField(verbose_name='Token', default=uuid4)
+    token = models.UUIDField(verbose_name='Token', default=uuid4, unique=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Время создания')
+
+    objects = TokenQuerySet.as_manager()
 
     def __str__(self):
-        return str(self.token)
\ No newline at end of file
+        return str(self.token)
+
+
+class OutgoingEmail(models.Model):
+    subject = models.CharField(max_length=200, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(max_length=254, blank=True, verbose_name='Отправитель')
+    recipient = models.EmailField(verbose_name='Получатель')
+    status = models.CharField(max_length=20, default=EMAIL_PENDING, choices=EMAIL_STATUSES, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Время отправки')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='outbox_pending_idx',
+                         condition=Q(status=EMAIL_PENDING)),
+        ]
+
+    def __str__(self):
+        return '{} -> {}'.format(self.subject, self.recipient)
+
+    def to_message(self, connection=None):
+        return EmailMessage(self.subject, self.body, self.from_email or settings.DEFAULT_FROM_EMAIL,
+                            [self.recipient], connection=connection)
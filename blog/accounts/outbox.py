@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import OutgoingEmail, EMAIL_PENDING, EMAIL_SENT, EMAIL_FAILED
+
+
+def queue_mail(subject, body, recipient, from_email=''):
+    """
+    Кладёт письмо в outbox. Вызывается внутри транзакции запроса,
+    так что письмо уйдёт только если запись пользователя закоммичена.
+    """
+    return OutgoingEmail.objects.create(subject=subject, body=body, recipient=recipient,
+                                        from_email=from_email)
+
+
+def get_backoff(attempts, base, limit=60 * 60):
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), limit))
+
+
+def send_pending(batch_size=100, max_attempts=5, backoff=60):
+    """
+    Отправляет одну пачку писем, которым подошло время, через одно
+    SMTP-соединение. Возвращает (отправлено, не отправлено).
+    Рассчитано на один рабочий процесс-отправитель.
+    """
+    now = timezone.now()
+    batch = list(OutgoingEmail.objects.filter(status=EMAIL_PENDING, next_attempt_at__lte=now)
+                 .order_by('next_attempt_at')[:batch_size])
+    if not batch:
+        return 0, 0
+    connection = get_connection()
+    sent, failed = [], []
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(email, e) for email in batch]
+    else:
+        try:
+            for email in batch:
+                try:
+                    connection.send_messages([email.to_message(connection=connection)])
+                    sent.append(email.pk)
+                except Exception as e:
+                    failed.append((email, e))
+        finally:
+            connection.close()
+    if sent:
+        OutgoingEmail.objects.filter(pk__in=sent).update(status=EMAIL_SENT, sent_at=timezone.now(),
+                                                         attempts=F('attempts') + 1, last_error='')
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = '{}: {}'.format(type(error).__name__, error)
+        if email.attempts >= max_attempts:
+            email.status = EMAIL_FAILED
+        else:
+            email.next_attempt_at = timezone.now() + get_backoff(email.attempts, backoff)
+        email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return len(sent), len(failed)
+
+
+def has_due():
+    return OutgoingEmail.objects.filter(status=EMAIL_PENDING, next_attempt_at__lte=timezone.now()).exists()
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+
+from accounts.caching import local_sessions
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    Сессии cached_db с ещё одним слоем - LRU в памяти процесса:
+    повторные запросы с той же сессией не ходят ни в базу, ни в общий кэш.
+    Если кэш не общий (CACHE_SHARED), сессия после LRU читается из базы:
+    выход в другом процессе иначе не заметить до конца срока сессии.
+    """
+
+    def load(self):
+        data = local_sessions.get(self.session_key) if self.session_key else None
+        if data is None:
+            if getattr(settings, 'CACHE_SHARED', False):
+                data = super().load()
+            else:
+                data = db.SessionStore.load(self)
+            if self.session_key:
+                local_sessions.set(self.session_key, data)
+        return data
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        local_sessions.set(self.session_key, self._session)
+
+    def delete(self, session_key=None):
+        local_sessions.delete(session_key or self.session_key)
+        super().delete(session_key)
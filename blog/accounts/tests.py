@@ -1,3 +1,167 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import skipUnless
+from uuid import uuid4
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts import caching
+from accounts.models import Token, OutgoingEmail, EMAIL_PENDING, EMAIL_SENT, EMAIL_FAILED
+from accounts.outbox import queue_mail, send_pending
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('Mail server is down')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class TokenQueryPlanTest(TestCase):
+    def test_lookup_by_token_uses_unique_index(self):
+        sql, params = Token.objects.filter(token=uuid4()).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('SEARCH accounts_token USING', plan)
+        self.assertIn('INDEX', plan)
+
+
+class OutboxTest(TestCase):
+    def test_register_queues_activation_mail(self):
+        response = self.client.post(reverse('accounts:register'), {
+            'username': 'newbie',
+            'password': 'secret-password',
+            'password_confirm': 'secret-password',
+            'email': 'newbie@example.com',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipient, 'newbie@example.com')
+        self.assertIn(str(Token.objects.get(user__username='newbie')), email.body)
+
+    def test_worker_sends_batch(self):
+        for i in range(3):
+            queue_mail('Subject {}'.format(i), 'Body', 'user{}@example.com'.format(i))
+        call_command('send_outbox', once=True, batch_size=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=EMAIL_SENT).count(), 3)
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.FailingEmailBackend')
+    def test_failed_mail_is_retried_with_backoff(self):
+        email = queue_mail('Subject', 'Body', 'user@example.com')
+        self.assertEqual(send_pending(max_attempts=2, backoff=60), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(send_pending(max_attempts=2), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_FAILED)
+        self.assertIn('Mail server is down', email.last_error)
+
+
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        caching.local_sessions.clear()
+        caching.local_users.clear()
+        self.user = User.objects.create_user('reader', password='secret-password')
+        self.client.login(username='reader', password='secret-password')
+        self.url = reverse('webapp:article_search')
+
+    def get_user(self):
+        return self.client.get(self.url).wsgi_request.user
+
+    def test_logged_in_page_skips_session_and_user_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_user(), self.user)
+
+    def test_profile_change_is_visible_at_once(self):
+        self.get_user()
+        response = self.client.post(reverse('accounts:user_update', kwargs={'pk': self.user.pk}),
+                                    {'first_name': 'Renamed', 'last_name': '', 'email': 'reader@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_user().first_name, 'Renamed')
+
+    def test_deactivated_user_is_logged_out(self):
+        self.get_user()
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.get_user().is_authenticated)
+
+    def test_logout_invalidates_cached_session(self):
+        session_cookie = self.client.cookies['sessionid'].value
+        self.get_user()
+        self.client.get(reverse('accounts:logout'))
+        self.client.cookies['sessionid'] = session_cookie
+        self.assertFalse(self.get_user().is_authenticated)
+
+    def forget_local(self):
+        # истёк AUTH_LOCAL_CACHE_TTL в процессе, который не видел сброса
+        caching.local_sessions.clear()
+        caching.local_users.clear()
+
+    def test_change_from_other_process_is_seen_after_local_ttl(self):
+        self.get_user()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.forget_local()
+        self.assertFalse(self.get_user().is_authenticated)
+
+    def test_logout_from_other_process_is_seen_after_local_ttl(self):
+        self.get_user()
+        Session.objects.all().delete()
+        self.forget_local()
+        self.assertFalse(self.get_user().is_authenticated)
+
+
+class TokenTest(TestCase):
+    def create_user(self, username, age=0, **kwargs):
+        user = User.objects.create_user(username, password='secret-password', is_active=False, **kwargs)
+        token = Token.objects.create(user=user, created_at=timezone.now() - timedelta(seconds=age))
+        return user, token
+
+    def activate(self, token):
+        return self.client.get(reverse('accounts:user_activate'), {'token': token})
+
+    def test_activation(self):
+        user, token = self.create_user('newbie')
+        self.assertEqual(self.activate(token).status_code, 302)
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(self.client.get(reverse('webapp:article_search')).wsgi_request.user, user)
+
+    @override_settings(ACTIVATION_TOKEN_TTL=60)
+    def test_expired_and_invalid_tokens_are_ignored(self):
+        user, token = self.create_user('late', age=61)
+        for value in (token, 'not-a-uuid', '', uuid4()):
+            self.assertEqual(self.activate(value).status_code, 302)
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @override_settings(ACTIVATION_TOKEN_TTL=60)
+    def test_purge_tokens(self):
+        stale, _ = self.create_user('stale', age=120)
+        fresh, _ = self.create_user('fresh', age=10)
+        returning, _ = self.create_user('returning', age=120, last_login=timezone.now())
+        active, _ = self.create_user('active', age=120)
+        User.objects.filter(pk=active.pk).update(is_active=True)
+        out = StringIO()
+        call_command('purge_tokens', batch_size=1, pause=0, stdout=out)
+        self.assertIn('Purged 3 tokens and 1 users.', out.getvalue())
+        self.assertEqual(set(User.objects.values_list('username', flat=True)), {'fresh', 'returning', 'active'})
+        self.assertEqual(list(Token.objects.values_list('user', flat=True)), [fresh.pk])
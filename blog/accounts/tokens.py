@@ -0,0 +1,58 @@
+from uuid import UUID
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from accounts.models import Token
+from webapp.db import retry_on_lock
+
+
+def parse_token(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
+@retry_on_lock
+def activate(token_value):
+    """
+    Активирует владельца непросроченного токена и удаляет его токены.
+    Поиск идёт по уникальному индексу вместе с пользователем; удаление
+    токенов служит и проверкой, что параллельный запрос не опередил нас.
+    Возвращает пользователя или None.
+    """
+    value = parse_token(token_value)
+    if value is None:
+        return None
+    with transaction.atomic():
+        token = Token.objects.active().select_related('user').filter(token=value).first()
+        if token is None:
+            return None
+        deleted, _ = Token.objects.filter(user_id=token.user_id).delete()
+        if not deleted:
+            return None
+        user = token.user
+        user.is_active = True
+        user.save(update_fields=['is_active'])
+    return user
+
+
+@retry_on_lock
+def purge_expired(batch_size=500):
+    """
+    Удаляет одну пачку просроченных токенов, а с ними - пользователей,
+    которые так и не активировались и ни разу не входили. Пачка - отдельная
+    короткая транзакция, чтобы не держать блокировку записи надолго.
+    Возвращает (удалено пользователей, удалено токенов).
+    """
+    with transaction.atomic():
+        rows = list(Token.objects.expired().order_by('created_at').values_list('pk', 'user_id')[:batch_size])
+        if not rows:
+            return 0, 0
+        users = User.objects.filter(pk__in={user_id for _, user_id in rows}, is_active=False,
+                                    last_login__isnull=True) \
+            .exclude(registration_tokens__in=Token.objects.active())
+        _, deleted = users.delete()
+        Token.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        return deleted.get(User._meta.label, 0), len(rows)
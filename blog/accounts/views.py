@@ -1,6 +1,7 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db import transaction
 from django.http import HttpResponseForbidden, HttpResponseRedirect
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
@@ -11,6 +12,8 @@ from blog.settings import HOST_NAME
 
 from accounts.forms import UserCreationForm, UserChangeForm, UserChangePasswordForm
 from accounts.models import Token
+from accounts.outbox import queue_mail
+from accounts.tokens import activate
 
 
 def login_view(request):
@@ -43,22 +46,24 @@ def register_view(request):
     elif request.method == 'POST':
         form = UserCreationForm(data=request.POST)
         if form.is_valid():
-            user = User(
-                username=form.cleaned_data['username'],
-                email=form.cleaned_data['email'],
-                is_active=False  # user не активный до подтверждения email
-            )
-            user.set_password(form.cleaned_data['password'])
-            user.save()
-
-            # токен для активации, его сложнее угадать, чем pk user-а.
-            token = Token.objects.create(user=user)
-            activation_url = HOST_NAME + reverse('accounts:user_activate') + \
-                             '?token={}'.format(token)
-
-            # отправка письма на email пользователя
-            user.email_user('Регистрация на сайте localhost',
-                            'Для активации перейдите по ссылке: {}'.format(activation_url))
+            with transaction.atomic():
+                user = User(
+                    username=form.cleaned_data['username'],
+                    email=form.cleaned_data['email'],
+                    is_active=False  # user не активный до подтверждения email
+                )
+                user.set_password(form.cleaned_data['password'])
+                user.save()
+
+                # токен для активации, его сложнее угадать, чем pk user-а.
+                token = Token.objects.create(user=user)
+                activation_url = HOST_NAME + reverse('accounts:user_activate') + \
+                                 '?token={}'.format(token)
+
+                # письмо уходит в outbox, отправляет его команда send_outbox
+                queue_mail('Регистрация на сайте localhost',
+                           'Для активации перейдите по ссылке: {}'.format(activation_url),
+                           user.email)
 
             return redirect("webapp:index")
         else:
@@ -66,27 +71,12 @@ def register_view(request):
 
 
 def user_activate(request):
-    token_value = request.GET.get('token')
-    try:
-        # найти токен
-        token = Token.objects.get(token=token_value)
-
-        # активировать пользователя
-        user = token.user
-        user.is_active = True
-        user.save()
-
-        # удалить токен, он больше не нужен
-        token.delete()
-
+    user = activate(request.GET.get('token'))
+    if user is not None:
         # войти
         login(request, user)
-
-        # редирект на главную
-        return redirect('webapp:index')
-    except Token.DoesNotExist:
-        # если токена нет - сразу редирект
-        return redirect('webapp:index')
+    # неизвестный или просроченный токен - просто редирект на главную
+    return redirect('webapp:index')
 
 
 class UserDetailView(DetailView):
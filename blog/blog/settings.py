@@ -44,22 +44,34 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'webapp.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware',
+    'webapp.middleware.ReplicaRoutingMiddleware',
+    'webapp.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'webapp.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'blog.urls'
 
+# Загрузчики шаблонов. В боевом режиме (DEBUG выключен или BLOG_TEMPLATE_CACHE=1)
+# шаблоны компилируются один раз на процесс и берутся из памяти,
+# а не перечитываются с диска при каждом get_template/include.
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+TEMPLATE_CACHE = os.environ.get('BLOG_TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -67,6 +79,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+            if TEMPLATE_CACHE else TEMPLATE_LOADERS,
         },
     },
 ]
@@ -84,6 +98,89 @@ DATABASES = {
     }
 }
 
+# Режим параллельной записи для SQLite (BLOG_SQLITE_CONCURRENT_WRITES=1):
+# PRAGMA из webapp.db.DEFAULT_SQLITE_PRAGMAS на каждом новом соединении
+# и постоянные соединения. SQLITE_PRAGMAS - только переопределения поверх них.
+SQLITE_CONCURRENT_WRITES = os.environ.get('BLOG_SQLITE_CONCURRENT_WRITES') == '1'
+SQLITE_PRAGMAS = {}
+if SQLITE_CONCURRENT_WRITES:
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+
+# Повторы записи при "database is locked": попытки и пауза (растёт вдвое до предела).
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_DELAY = 0.05
+WRITE_RETRY_MAX_DELAY = 1.0
+
+# Реплики только для чтения: BLOG_DB_REPLICAS="replica1.sqlite3,replica2.sqlite3".
+# Локально файлы реплик наполняются командой sync_replicas.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('BLOG_DB_REPLICAS', '').split(',')), 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, name.strip()),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['webapp.routers.PrimaryReplicaRouter']
+
+# Представления, чьи GET-запросы читают с реплики.
+REPLICA_READ_VIEWS = [
+    'webapp:index',
+    'webapp:article_view',
+    'webapp:comment_list',
+    'webapp:search_results',
+    'webapp:tag_view',
+    'webapp:tag_cloud',
+    'accounts:user_detail',
+]
+
+# Сколько секунд после изменяющего запроса клиент читает с основной базы.
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'primary_pin'
+
+
+# Версии кусков страниц, ETag и кэш пользователей сбрасываются записью
+# в кэш, поэтому он должен быть общим для всех процессов: при нескольких
+# воркерах задайте BLOG_MEMCACHED=host:port[,host:port]. Без него кэш
+# живёт в памяти процесса, и другие процессы не видят сброса, пока
+# запись не истечёт - сроки ниже для этого случая укорочены.
+MEMCACHED_LOCATIONS = [location.strip() for location in os.environ.get('BLOG_MEMCACHED', '').split(',')
+                       if location.strip()]
+CACHE_SHARED = bool(MEMCACHED_LOCATIONS)
+if CACHE_SHARED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATIONS,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'blog',
+        }
+    }
+
+# Сессии и строки auth_user: LRU в памяти процесса (до AUTH_LOCAL_CACHE_SIZE
+# записей на AUTH_LOCAL_CACHE_TTL секунд), затем общий кэш, затем база.
+# Сбрасываются при сохранении пользователя и выходе. Отключённый
+# пользователь, сменённый пароль или выход в другом процессе вступают
+# в силу не позже чем через AUTH_LOCAL_CACHE_TTL секунд. Без общего кэша
+# (CACHE_SHARED) второй слой не используется - его сброс не дошёл бы
+# до других процессов - и после LRU читается база.
+SESSION_ENGINE = 'accounts.sessions'
+AUTH_USER_CACHE_TIMEOUT = 300
+AUTH_LOCAL_CACHE_SIZE = 1000
+AUTH_LOCAL_CACHE_TTL = 5
+
+# Время жизни отрендеренных кусков страницы статьи и их версий в кэше.
+# С кэшем в памяти процесса это и есть предел, сколько другие процессы
+# отдают старое тело статьи, страницу комментариев или ETag после правки.
+ARTICLE_CACHE_TIMEOUT = 60 * 60 * 24 if CACHE_SHARED else 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,6 +219,13 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# collectstatic: имена с хэшем содержимого и сжатые .gz рядом;
+# blog.wsgi отдаёт их сам (BLOG_SERVE_STATIC=0 - отдать это веб-серверу).
+STATIC_ROOT = os.path.join(BASE_DIR, 'static_root')
+STATICFILES_STORAGE = 'webapp.static_assets.CompressedManifestStaticFilesStorage'
+SERVE_STATIC = os.environ.get('BLOG_SERVE_STATIC', '1') == '1'
+# файлы без хэша в имени (например, добавленные в обход collectstatic)
+STATIC_MAX_AGE = 60
 
 LOGIN_URL = 'accounts:login'
 
@@ -132,3 +236,53 @@ EMAIL_HOST_PASSWORD = '9ef7c1717c6756'
 EMAIL_PORT = '2525'
 
 HOST_NAME = 'localhost:8000'
+
+# Срок жизни ссылки активации; просроченные токены и неактивированных
+# пользователей удаляет команда purge_tokens.
+ACTIVATION_TOKEN_TTL = 60 * 60 * 24 * 3
+
+# Бюджет SQL-запросов на один запрос к странице (по имени URL).
+# 'log' - предупреждение в лог, 'raise' - исключение, None - выключено.
+QUERY_BUDGET_ACTION = 'log' if DEBUG else None
+QUERY_BUDGETS = {
+    'webapp:index': {'queries': 5, 'duplicates': 0},
+    'webapp:archive': {'queries': 4, 'duplicates': 0},
+    'webapp:article_view': {'queries': 5, 'duplicates': 0},
+    'webapp:comment_list': {'queries': 4, 'duplicates': 0},
+    'webapp:search_results': {'queries': 4, 'duplicates': 0},
+    'webapp:tag_view': {'queries': 5, 'duplicates': 0},
+    'webapp:tag_cloud': {'queries': 3, 'duplicates': 0},
+    'webapp:api_article_list': {'queries': 1, 'duplicates': 0},
+    'webapp:api_article_detail': {'queries': 1, 'duplicates': 0},
+    'webapp:api_article_comments': {'queries': 2, 'duplicates': 0},
+    # единственный запрос - пересборка индекса подсказок после старта или по таймеру
+    'webapp:typeahead': {'queries': 1, 'duplicates': 0},
+}
+
+
+# Админка на больших таблицах: сколько секунд кэшируется COUNT списка
+# и список авторов для фильтра, сколько авторов и комментариев показывать.
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+ADMIN_FILTER_CACHE_TIMEOUT = 600
+ADMIN_AUTHOR_FILTER_SIZE = 50
+ADMIN_INLINE_COMMENTS = 20
+
+
+# Подсказки быстрого поиска: индекс в памяти каждого процесса,
+# строится при первом запросе и обновляется сигналами.
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+
+
+# Сколько секунд общий кэш (CDN, прокси) может отдавать анонимам
+# ленту и страницу статьи без перепроверки.
+HTML_CACHE_MAX_AGE = 60
+
+
+# Заголовок Server-Timing (view, render, sql, total) на каждом ответе.
+# Только при отладке: иначе тайминги и число запросов видит любой посетитель.
+SERVER_TIMING = DEBUG
+
+# ?_profile в запросе staff-пользователя - профиль cProfile вместо страницы.
+PROFILER_QUERY_PARAM = '_profile'
+PROFILER_LIMIT = 30
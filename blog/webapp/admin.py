@@ -1,25 +1,170 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html
+
+from webapp import bulk, caching, search
 from webapp.models import Article, Comment, Category, Tag
+from webapp.pagination import CachedCountPaginator
+
+
+def run_bulk(modeladmin, request, queryset, operation, message):
+    affected = operation(list(queryset.values_list('pk', flat=True)))
+    modeladmin.message_user(request, message.format(affected), messages.SUCCESS)
+
+
+def archive_articles(modeladmin, request, queryset):
+    run_bulk(modeladmin, request, queryset, bulk.archive_articles, 'В архив: {}')
+
+
+archive_articles.short_description = 'Отправить в архив'
+archive_articles.allowed_permissions = ('change',)
+
+
+def unarchive_articles(modeladmin, request, queryset):
+    run_bulk(modeladmin, request, queryset, bulk.unarchive_articles, 'Из архива: {}')
+
+
+unarchive_articles.short_description = 'Вернуть из архива'
+unarchive_articles.allowed_permissions = ('change',)
+
+
+def delete_comments(modeladmin, request, queryset):
+    run_bulk(modeladmin, request, queryset, bulk.delete_comments, 'Удалено комментариев: {}')
+
+
+delete_comments.short_description = 'Удалить выбранные комментарии'
+delete_comments.allowed_permissions = ('delete',)
+
+
+def get_top_authors():
+    size = getattr(settings, 'ADMIN_AUTHOR_FILTER_SIZE', 50)
+    return list(Article.objects.values('author').annotate(articles=Count('pk'))
+                .order_by('-articles', 'author').values_list('author', flat=True)[:size])
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """
+    Фильтр по автору без DISTINCT по всей таблице на каждой загрузке:
+    в списке самые частые авторы, список кэшируется.
+    """
+    title = 'Автор'
+    parameter_name = 'author'
+
+    def lookups(self, request, model_admin):
+        authors = cache.get_or_set(caching.ADMIN_AUTHORS_KEY, get_top_authors,
+                                   getattr(settings, 'ADMIN_FILTER_CACHE_TIMEOUT', 600))
+        if self.value() and self.value() not in authors:
+            authors = authors + [self.value()]
+        return [(author, author) for author in authors]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(author=self.value())
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # COUNT по всей таблице не считается, COUNT отфильтрованного списка кэшируется
+    show_full_result_count = False
+    paginator = CachedCountPaginator
+
+
+class LatestCommentsFormSet(BaseInlineFormSet):
+    """
+    В форме статьи - только последние комментарии, а не все сразу.
+    При сохранении комментарии берутся по присланным id из всех
+    комментариев статьи: если с момента открытия формы появились новые,
+    окно "последних" сдвинулось бы, и правки выпавших молча пропали бы.
+    """
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = self.queryset.order_by('-created_at', '-pk')
+            if self.is_bound:
+                self._queryset = queryset.filter(pk__in=self.get_posted_pks())
+            else:
+                self._queryset = queryset[:getattr(settings, 'ADMIN_INLINE_COMMENTS', 20)]
+        return self._queryset
+
+    def get_posted_pks(self):
+        pk_field = self.model._meta.pk
+        pks = []
+        for index in range(self.initial_form_count()):
+            value = self.data.get('{}-{}'.format(self.add_prefix(index), pk_field.name))
+            try:
+                pks.append(pk_field.to_python(value))
+            except ValidationError:
+                continue
+        return [pk for pk in pks if pk is not None]
 
 
 class CommentAdmin(admin.TabularInline):
     model = Comment
     fields = ['author', 'text']
     extra = 0
+    formset = LatestCommentsFormSet
+    verbose_name_plural = 'Последние комментарии'
 
 
-class ArticleAdmin(admin.ModelAdmin):
-    list_display = ['pk', 'title', 'author', 'created_at']
-    list_filter = ['author', 'category']
+class ArticleAdmin(LargeTableAdmin):
+    list_display = ['pk', 'title', 'author', 'status', 'created_at']
+    list_filter = [AuthorFilter, 'category', 'status']
     list_display_links = ['pk', 'title']
+    list_select_related = ['category']
     search_fields = ['title', 'text']
     exclude = []
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'comment_count', 'all_comments', 'last_commented_at']
+    autocomplete_fields = ['category', 'tags']
     inlines = [CommentAdmin]
+    actions = [archive_articles, unarchive_articles]
 
+    def get_search_results(self, request, queryset, search_term):
+        # полнотекстовый индекс вместо LIKE '%...%' по заголовку и тексту
+        if search_term:
+            found = search.filter_queryset(queryset, search_term, ['title', 'text'])
+            if found is not None:
+                return found, False
+        return super().get_search_results(request, queryset, search_term)
 
-admin.site.register(Article, ArticleAdmin)
-admin.site.register(Comment)
-admin.site.register(Category)
-admin.site.register(Tag)
+    def all_comments(self, obj):
+        if obj.pk is None:
+            return '-'
+        url = reverse('admin:webapp_comment_changelist') + '?article__id__exact={}'.format(obj.pk)
+        return format_html('<a href="{}">Все комментарии ({})</a>', url, obj.comment_count)
+
+    all_comments.short_description = 'Комментарии'
 
+
+class CommentModerationAdmin(LargeTableAdmin):
+    list_display = ['pk', 'author', '__str__', 'article', 'created_at']
+    list_select_related = ['article']
+    autocomplete_fields = ['article']
+    actions = [delete_comments]
+
+    def get_actions(self, request):
+        # стандартное удаление идёт по одному объекту с сигналами - для модерации есть delete_comments
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+class CategoryAdmin(admin.ModelAdmin):
+    search_fields = ['name']
+    ordering = ['name']
+
+
+class TagAdmin(LargeTableAdmin):
+    list_display = ['name', 'slug', 'article_count']
+    search_fields = ['name']
+    ordering = ['-article_count', 'pk']
+
+
+admin.site.register(Article, ArticleAdmin)
+admin.site.register(Comment, CommentModerationAdmin)
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Tag, TagAdmin)
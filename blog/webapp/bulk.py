@@ -0,0 +1,93 @@
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from webapp import caching, search, typeahead
+from webapp.db import retry_on_lock
+from webapp.models import Article, Comment, Counter, Tag, STATUS_ACTIVE, STATUS_ARCHIVED, ARCHIVED_ARTICLES_COUNTER
+
+
+# ограничение SQLite на число параметров в одном запросе
+BATCH_SIZE = 500
+
+
+def batches(pks):
+    pks = set(pks)
+    if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in pks):
+        raise TypeError('ids should be integers')
+    pks = sorted(pks)
+    for start in range(0, len(pks), BATCH_SIZE):
+        yield pks[start:start + BATCH_SIZE]
+
+
+@retry_on_lock
+def set_article_status(pks, status):
+    """
+    Меняет статус статей через update() пачками, без save() и сигналов
+    на каждую статью. Счётчик архива, версии в кэше и подсказки поиска
+    обновляются один раз за всю операцию, счётчики статей у тегов -
+    по пачке. Возвращает число изменённых статей.
+    """
+    changed = []
+    now = timezone.now()
+    with transaction.atomic():
+        for batch in batches(pks):
+            articles = Article.objects.filter(pk__in=batch).exclude(status=status)
+            rows = list(articles.values_list('pk', 'title', 'author'))
+            changed_pks = [pk for pk, _, _ in rows]
+            Article.objects.filter(pk__in=changed_pks).update(status=status, updated_at=now)
+            tagged = Article.tags.through.objects.filter(article_id__in=changed_pks).values('tag_id')
+            Tag.objects.filter(pk__in=tagged).refresh_article_counts()
+            changed.extend(rows)
+        delta = len(changed) if status == STATUS_ARCHIVED else -len(changed)
+        Counter.increment(ARCHIVED_ARTICLES_COUNTER, delta)
+    if changed:
+        caching.forget_articles([pk for pk, _, _ in changed])
+        caching.bump_articles_version()
+        caching.bump_tags_version()
+        typeahead.update_articles(changed, active=status == STATUS_ACTIVE)
+    return len(changed)
+
+
+def archive_articles(pks):
+    return set_article_status(pks, STATUS_ARCHIVED)
+
+
+def unarchive_articles(pks):
+    return set_article_status(pks, STATUS_ACTIVE)
+
+
+def delete_comments(pks):
+    """
+    Удаляет комментарии пачками, каждая - своей короткой транзакцией
+    с одним DELETE вместо удаления по одному с сигналами. Счётчики
+    и поисковый индекс затронутых статей пересчитываются по пачке,
+    версии в кэше сбрасываются один раз в конце. Возвращает число удалённых.
+    """
+    deleted, article_ids = 0, set()
+    for batch in batches(pks):
+        batch_deleted, batch_article_ids = _delete_comment_batch(batch)
+        deleted += batch_deleted
+        article_ids |= batch_article_ids
+    for article_id in article_ids:
+        caching.bump_comments_version(article_id)
+    if article_ids:
+        caching.bump_articles_version()
+    return deleted
+
+
+@retry_on_lock
+def _delete_comment_batch(batch):
+    using = router.db_for_write(Comment)
+    placeholders = ', '.join(['%s'] * len(batch))
+    with transaction.atomic(using=using):
+        comments = Comment.objects.using(using).filter(pk__in=batch)
+        article_ids = set(comments.values_list('article_id', flat=True))
+        # у комментариев нет зависимых записей - один DELETE без сборщика и сигналов,
+        # счётчики и индекс статей пересчитываются ниже явно
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(
+                Comment._meta.db_table, Comment._meta.pk.column, placeholders), batch)
+            deleted = cursor.rowcount
+        Article.objects.using(using).filter(pk__in=article_ids).refresh_comment_counters()
+        search.index_articles(article_ids, using=using)
+    return deleted, article_ids
@@ -0,0 +1,157 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+ARTICLE_VERSION_KEY = 'webapp:article:{}:version'
+COMMENTS_VERSION_KEY = 'webapp:article:{}:comments'
+CATEGORIES_VERSION_KEY = 'webapp:categories:version'
+# лента статей: меняется при любой записи статьи или комментария
+ARTICLES_VERSION_KEY = 'webapp:articles:version'
+TAGS_VERSION_KEY = 'webapp:tags:version'
+TAG_CLOUD_KEY = 'webapp:tags:cloud:{}'
+# поколение реплик: меняется после каждой синхронизации
+REPLICA_GENERATION_KEY = 'webapp:replicas:generation'
+# самые частые авторы для фильтра в админке
+ADMIN_AUTHORS_KEY = 'webapp:admin:authors'
+BODY_KEY = 'webapp:article:{}:body:{}:{}:{}'
+COMMENT_PAGE_KEY = 'webapp:article:{}:comment_page:{}:{}:{}:{}'
+
+
+def get_timeout():
+    return getattr(settings, 'ARTICLE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def new_version():
+    # после вытеснения ключа версия не должна совпасть со старой
+    return int(time.time() * 1000)
+
+
+def get_article_version(article):
+    """
+    Версия статьи - её updated_at. Пишется в кэш из сигнала при сохранении;
+    при чтении ставится через add, чтобы не затереть более свежую версию.
+    """
+    version = '{:.6f}'.format(article.updated_at.timestamp())
+    cache.add(ARTICLE_VERSION_KEY.format(article.pk), version, get_timeout())
+    return version
+
+
+def set_article_version(article):
+    version = '{:.6f}'.format(article.updated_at.timestamp())
+    cache.set(ARTICLE_VERSION_KEY.format(article.pk), version, get_timeout())
+
+
+def get_versions(pk):
+    keys = [ARTICLE_VERSION_KEY.format(pk), COMMENTS_VERSION_KEY.format(pk), CATEGORIES_VERSION_KEY]
+    values = cache.get_many(keys)
+    return [values.get(key) for key in keys]
+
+
+def ensure_version(key):
+    cache.add(key, new_version(), get_timeout())
+    return cache.get(key)
+
+
+def get_comments_version(pk, current=None):
+    return current or ensure_version(COMMENTS_VERSION_KEY.format(pk))
+
+
+def get_categories_version(current=None):
+    return current or ensure_version(CATEGORIES_VERSION_KEY)
+
+
+def get_tags_version():
+    return ensure_version(TAGS_VERSION_KEY)
+
+
+def get_tag_cloud(version):
+    return cache.get(TAG_CLOUD_KEY.format(version))
+
+
+def set_tag_cloud(version, tags):
+    cache.set(TAG_CLOUD_KEY.format(version), tags, get_timeout())
+
+
+def get_articles_version():
+    return ensure_version(ARTICLES_VERSION_KEY)
+
+
+def get_read_source(alias):
+    """
+    Откуда читаются данные страницы: основная база или реплика текущего
+    поколения. Входит в ключи кусков и в ETag, чтобы отстающая реплика
+    не подменила в кэше то, что пользователь только что записал.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return alias
+    return '{}:{}'.format(alias, ensure_version(REPLICA_GENERATION_KEY))
+
+
+def bump_replica_generation():
+    bump_version(REPLICA_GENERATION_KEY)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), get_timeout())
+
+
+def bump_comments_version(pk):
+    bump_version(COMMENTS_VERSION_KEY.format(pk))
+
+
+def bump_categories_version():
+    bump_version(CATEGORIES_VERSION_KEY)
+
+
+def bump_articles_version():
+    bump_version(ARTICLES_VERSION_KEY)
+
+
+def bump_tags_version():
+    bump_version(TAGS_VERSION_KEY)
+
+
+def forget_article(pk):
+    cache.delete_many([ARTICLE_VERSION_KEY.format(pk), COMMENTS_VERSION_KEY.format(pk)])
+
+
+def forget_articles(pks):
+    """
+    Сброс версий сразу многих статей - для массовых операций в обход сигналов.
+    """
+    cache.delete_many([key.format(pk) for pk in pks for key in (ARTICLE_VERSION_KEY, COMMENTS_VERSION_KEY)])
+
+
+def get_fragment_keys(pk, cursor, source, article_version, comments_version, categories_version):
+    body_key = BODY_KEY.format(pk, source, article_version, categories_version)
+    comment_page_key = COMMENT_PAGE_KEY.format(pk, source, article_version, comments_version, cursor or '')
+    return body_key, comment_page_key
+
+
+def get_fragments(pk, cursor, versions, source=DEFAULT_DB_ALIAS):
+    """
+    Отрендеренные куски страницы статьи без единого запроса к БД.
+    None - если нет какой-то из версий или самих кусков.
+    """
+    if None in versions:
+        return None
+    keys = get_fragment_keys(pk, cursor, source, *versions)
+    values = cache.get_many(keys)
+    if len(values) != len(keys):
+        return None
+    body, comment_page = [values[key] for key in keys]
+    return {'article': body['article'], 'body': body['html'], 'comment_page': comment_page}
+
+
+def set_fragments(pk, cursor, versions, fragments, source=DEFAULT_DB_ALIAS):
+    body_key, comment_page_key = get_fragment_keys(pk, cursor, source, *versions)
+    cache.set_many({
+        body_key: {'article': fragments['article'], 'html': fragments['body']},
+        comment_page_key: fragments['comment_page'],
+    }, get_timeout())
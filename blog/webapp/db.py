@@ -0,0 +1,79 @@
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
+
+def configure_connection(connection):
+    """
+    Режим для параллельной записи в SQLite (settings.SQLITE_CONCURRENT_WRITES):
+    WAL, чтобы читатели не ждали писателя, ожидание блокировки вместо
+    мгновенной ошибки и более дешёвый fsync. settings.SQLITE_PRAGMAS
+    переопределяет отдельные значения из DEFAULT_SQLITE_PRAGMAS.
+    """
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_CONCURRENT_WRITES', False):
+        return
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCK_ERRORS)
+
+
+def retry_on_lock(func=None, *, reset=None):
+    """
+    Повторяет запись, упавшую на блокировке базы, с растущей паузой.
+    Функция должна сама открывать транзакцию: повтор возможен только
+    снаружи atomic-блока, иначе ошибка пробрасывается как есть.
+    Перед каждым повтором вызывается reset(*args, **kwargs) - он убирает
+    следы откатившейся попытки из объектов, которые переживают повтор.
+    """
+    if func is None:
+        return functools.partial(retry_on_lock, reset=reset)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = getattr(settings, 'WRITE_RETRY_ATTEMPTS', 5)
+        delay = getattr(settings, 'WRITE_RETRY_DELAY', 0.05)
+        max_delay = getattr(settings, 'WRITE_RETRY_MAX_DELAY', 1.0)
+        for attempt in range(1, attempts + 1):
+            if attempt > 1 and reset is not None:
+                reset(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_error(e) or attempt == attempts or transaction.get_connection().in_atomic_block:
+                    raise
+                pause = min(max_delay, delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1)
+                logger.info('%s: %s, retry %d in %.3fs', func.__qualname__, e, attempt, pause)
+                time.sleep(pause)
+
+    return wrapper
+
+
+def reset_unsaved(instance):
+    """
+    Экземпляр, чей INSERT откатился вместе с транзакцией, снова считается
+    новым: иначе повторный save() пошёл бы в UPDATE несуществующей строки.
+    """
+    instance.pk = None
+    instance._state.adding = True
@@ -7,7 +7,7 @@ from webapp.models import Article, Comment, STATUS_ACTIVE
 class ArticleForm(forms.ModelForm):
     class Meta:
         model = Article
-        exclude = ['created_at', 'updated_at', 'status']
+        exclude = ['created_at', 'updated_at', 'status', 'comment_count', 'last_commented_at']
 
     def clean_title(self):
         title = self.cleaned_data['title']
@@ -21,7 +21,7 @@ class ArticleForm(forms.ModelForm):
         if self.cleaned_data.get('text') == self.cleaned_data.get('title'):
             raise ValidationError('Article text should not duplicate article title',
                                   code='title_text_duplicate')
-        return self.cleaned_data.get('text')
+        return self.cleaned_data
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,207 @@
+import json
+import random
+import time
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, \
+    setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from webapp import search
+from webapp.models import Article, Comment, Category, Tag, STATUS_ACTIVE, STATUS_ARCHIVED, make_tag_slug
+from webapp.pagination import CursorPaginator
+
+
+WORDS = ('python', 'django', 'sqlite', 'index', 'cache', 'query', 'server', 'latency',
+         'article', 'comment', 'archive', 'search', 'tag', 'category', 'profile', 'budget')
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетические данные во временной базе, гоняет основные страницы ' \
+           'через тестовый клиент и пишет p50/p95/p99 и число запросов в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на каждый сценарий')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='bench.json')
+        parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Допустимый рост p95, процентов')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(QUERY_BUDGET_ACTION=None, SERVER_TIMING=False):
+                started = time.perf_counter()
+                self.generate(options)
+                self.stdout.write('data generated in {:.1f}s'.format(time.perf_counter() - started))
+                results = self.run_scenarios(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'volume': {key: options[key] for key in ('articles', 'comments', 'tags', 'categories')},
+            'scenarios': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.print_results(results)
+        self.stdout.write('report written to {}'.format(options['output']))
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def generate(self, options):
+        batch_size = options['batch_size']
+        rnd = self.random
+        categories = Category.objects.bulk_create(
+            [Category(pk=i, name='Category {}'.format(i)) for i in range(1, options['categories'] + 1)]
+        )
+        tag_names = ['{}{}'.format(rnd.choice(WORDS), i) for i in range(1, options['tags'] + 1)]
+        Tag.objects.bulk_create(
+            [Tag(pk=i, name=name, slug=make_tag_slug(name)) for i, name in enumerate(tag_names, 1)]
+        )
+        # длинный хвост: немногие теги встречаются часто, большинство - редко
+        tag_ids = list(range(1, options['tags'] + 1))
+        tag_weights = [1 / rank ** 1.1 for rank in tag_ids]
+
+        articles, tagged = [], []
+        for pk in range(1, options['articles'] + 1):
+            articles.append(Article(
+                pk=pk,
+                title=' '.join(rnd.choice(WORDS) for _ in range(4)).capitalize(),
+                text=' '.join(rnd.choice(WORDS) for _ in range(60)),
+                author='Author {}'.format(rnd.randint(1, 500)),
+                category_id=rnd.choice(categories).pk if rnd.random() < 0.8 else None,
+                status=STATUS_ARCHIVED if rnd.random() < 0.1 else STATUS_ACTIVE,
+            ))
+            if options['tags']:
+                for tag_id in set(rnd.choices(tag_ids, tag_weights, k=rnd.randint(0, 4))):
+                    tagged.append(Article.tags.through(article_id=pk, tag_id=tag_id))
+            if len(articles) >= batch_size:
+                Article.objects.bulk_create(articles)
+                articles = []
+        Article.objects.bulk_create(articles)
+        Article.tags.through.objects.bulk_create(tagged)
+
+        comments = []
+        for _ in range(options['comments']):
+            # комментарии тоже скошены к небольшому числу "горячих" статей
+            article_id = int(options['articles'] * rnd.random() ** 3) + 1
+            comments.append(Comment(article_id=article_id, author='Reader',
+                                    text=' '.join(rnd.choice(WORDS) for _ in range(12))))
+            if len(comments) >= batch_size:
+                Comment.objects.bulk_create(comments)
+                comments = []
+        Comment.objects.bulk_create(comments)
+
+        search.rebuild()
+        call_command('rebuild_counters', stdout=StringIO())
+
+    def get_scenarios(self):
+        rnd = self.random
+        last_pk = Article.objects.order_by('-pk').values_list('pk', flat=True).first() or 1
+        active_pks = list(Article.objects.filter(status=STATUS_ACTIVE).values_list('pk', flat=True)[:1000])
+        paginator = CursorPaginator(Article.objects.filter(status=STATUS_ACTIVE), 5)
+        deep = paginator.object_list.values_list('created_at', 'pk')[5 * 50:5 * 50 + 1]
+        deep_cursor = paginator.encode_cursor(deep[0], 51) if deep else ''
+        tag_slugs = list(Tag.objects.order_by('pk').values_list('slug', flat=True)[:20])
+
+        def article_form(title_prefix):
+            return {'title': '{} {}'.format(title_prefix, rnd.randint(1, 10 ** 9)),
+                    'text': ' '.join(rnd.choice(WORDS) for _ in range(30)),
+                    'author': 'Bench'}
+
+        scenarios = [
+            ('index', lambda: ('get', reverse('webapp:index'), None)),
+            ('index_page_51', lambda: ('get', reverse('webapp:index') + '?cursor=' + deep_cursor, None)),
+            ('article', lambda: ('get', reverse('webapp:article_view',
+                                                kwargs={'pk': rnd.randint(1, last_pk)}), None)),
+            ('search', lambda: ('get', reverse('webapp:search_results') +
+                                '?text={}&in_title=on&in_text=on'.format(rnd.choice(WORDS)), None)),
+            ('comment_list', lambda: ('get', reverse('webapp:comment_list'), None)),
+            ('article_create', lambda: ('post', reverse('webapp:article_add'),
+                                        article_form('Benchmark article'))),
+            ('article_update', lambda: ('post', reverse('webapp:article_update',
+                                                        kwargs={'pk': rnd.choice(active_pks)}),
+                                        article_form('Updated article'))),
+            ('comment_create', lambda: ('post', reverse('webapp:article_comment_create',
+                                                        kwargs={'pk': rnd.choice(active_pks)}),
+                                        {'author': 'Bench', 'text': 'Benchmark comment'})),
+        ]
+        if tag_slugs:
+            scenarios.append(('tag', lambda: ('get', reverse('webapp:tag_view',
+                                                             kwargs={'slug': rnd.choice(tag_slugs)}), None)))
+        return scenarios
+
+    def run_scenarios(self, requests):
+        client = Client()
+        client.force_login(User.objects.create_user('bench', password='bench'))
+        results = {}
+        for name, make_request in self.get_scenarios():
+            timings, queries = [], []
+            for _ in range(requests):
+                method, url, data = make_request()
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError('{} {} -> {}'.format(method.upper(), url, response.status_code))
+                queries.append(len(context))
+            results[name] = {
+                'requests': requests,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'queries_p50': percentile(queries, 50),
+                'queries_max': max(queries),
+            }
+        return results
+
+    def print_results(self, results):
+        self.stdout.write('{:<16} {:>10} {:>10} {:>10} {:>8} {:>8}'.format(
+            'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'q p50', 'q max'))
+        for name, result in results.items():
+            self.stdout.write('{:<16} {p50_ms:>10.2f} {p95_ms:>10.2f} {p99_ms:>10.2f} '
+                              '{queries_p50:>8} {queries_max:>8}'.format(name, **result))
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if not base:
+                continue
+            change = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+            self.stdout.write('{:<16} p95 {:>+7.1f}%  queries {} -> {}'.format(
+                name, change, base['queries_max'], result['queries_max']))
+            if change > threshold:
+                regressions.append('{}: p95 {:.2f}ms -> {:.2f}ms'.format(name, base['p95_ms'], result['p95_ms']))
+            if result['queries_max'] > base['queries_max']:
+                regressions.append('{}: queries {} -> {}'.format(name, base['queries_max'],
+                                                                 result['queries_max']))
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against {}'.format(baseline_path)))
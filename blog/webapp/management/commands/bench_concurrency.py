@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from webapp.management.commands.bench import percentile
+from webapp.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Гоняет N параллельных писателей комментариев к нескольким "горячим" статьям ' \
+           'во временной файловой базе SQLite и печатает пропускную способность записи ' \
+           'в обычном режиме и в режиме SQLITE_CONCURRENT_WRITES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--articles', type=int, default=3, help='Сколько статей делят писатели')
+        parser.add_argument('--modes', default='default,concurrent',
+                            help='Через запятую: default, concurrent')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_concurrency measures the SQLite backend only.')
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        if not modes or set(modes) - {'default', 'concurrent'}:
+            raise CommandError('Unknown mode in --modes.')
+        setup_test_environment()
+        try:
+            self.stdout.write('{:<12} {:>8} {:>10} {:>8} {:>9} {:>9}'.format(
+                'mode', 'writes', 'writes/s', 'errors', 'p50 ms', 'p99 ms'))
+            for mode in modes:
+                with override_settings(SQLITE_CONCURRENT_WRITES=mode == 'concurrent',
+                                       QUERY_BUDGET_ACTION=None, SERVER_TIMING=False):
+                    result = self.run_mode(options)
+                self.stdout.write('{:<12} {writes:>8} {rate:>10.1f} {errors:>8} {p50:>9.2f} {p99:>9.2f}'
+                                  .format(mode, **result))
+        finally:
+            teardown_test_environment()
+
+    def run_mode(self, options):
+        # у каждого режима свой файл: journal_mode=WAL сохраняется в самой базе
+        directory = tempfile.mkdtemp()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = User.objects.create_user('bench', password='bench')
+            pks = [Article.objects.create(title='Hot article {}'.format(i), text='Text').pk
+                   for i in range(options['articles'])]
+            connection.close()
+            return self.run_writers(user, pks, options['writers'], options['seconds'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = None
+            os.rmdir(directory)
+
+    def run_writers(self, user, pks, writers, seconds):
+        deadline = time.perf_counter() + seconds
+        timings, errors = [], []
+        lock = threading.Lock()
+
+        def write(number):
+            client = Client()
+            client.force_login(user)
+            own_timings, own_errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    url = reverse('webapp:article_comment_create', kwargs={'pk': pks[number % len(pks)]})
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(url, {'author': 'Writer {}'.format(number), 'text': 'Comment'})
+                        ok = response.status_code == 302
+                    except OperationalError:
+                        ok = False
+                    if ok:
+                        own_timings.append((time.perf_counter() - started) * 1000)
+                    else:
+                        own_errors += 1
+                    number += writers
+            finally:
+                connections.close_all()
+                with lock:
+                    timings.extend(own_timings)
+                    errors.append(own_errors)
+
+        threads = [threading.Thread(target=write, args=(number,)) for number in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'writes': len(timings),
+            'rate': len(timings) / elapsed,
+            'errors': sum(errors),
+            'p50': percentile(timings, 50) if timings else 0,
+            'p99': percentile(timings, 99) if timings else 0,
+        }
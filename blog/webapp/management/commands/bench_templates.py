@@ -0,0 +1,98 @@
+import time
+from statistics import median
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+from django.utils import timezone
+
+from webapp.forms import SimpleSearchForm
+from webapp.models import Article, Comment, Category, Tag
+
+
+# один и тот же список в обоих вариантах: {% url %} в каждой строке и адрес, разобранный до цикла
+URL_TAG_ROWS = '''{% for article in articles %}
+<a href="{% url 'webapp:article_view' article.pk %}">More</a>
+<a href="{% url 'webapp:article_update' article.pk %}">Edit</a>
+<a href="{% url 'webapp:article_delete' article.pk %}">Delete</a>
+{% endfor %}'''
+URL_TEMPLATE_ROWS = '''{% load fast_urls %}
+{% url_template 'webapp:article_view' as article_url %}
+{% url_template 'webapp:article_update' as update_url %}
+{% url_template 'webapp:article_delete' as delete_url %}
+{% for article in articles %}
+<a href="{{ article_url|fill:article.pk }}">More</a>
+<a href="{{ update_url|fill:article.pk }}">Edit</a>
+<a href="{{ delete_url|fill:article.pk }}">Delete</a>
+{% endfor %}'''
+
+
+class Command(BaseCommand):
+    help = 'Рендерит списочные шаблоны на --rows строк из памяти (без базы) с загрузчиками ' \
+           'без кэша и с кэшем скомпилированных шаблонов и печатает выигрыш; отдельно сравнивает ' \
+           '{% url %} в каждой строке с url_template'
+
+    templates = ('article/index.html', 'article/archive.html', 'comment/list.html', 'tag/view.html')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=15, help='Рендеров каждого шаблона в каждом режиме')
+
+    def handle(self, *args, **options):
+        base = engines['django'].engine
+        engine_options = {'context_processors': base.context_processors, 'libraries': base.libraries}
+        plain = Engine(loaders=settings.TEMPLATE_LOADERS, **engine_options)
+        cached = Engine(loaders=[('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)],
+                        **engine_options)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = self.get_context(options['rows'])
+
+        self.stdout.write('{:<22} {:>12} {:>12} {:>8}'.format('template', 'disk ms', 'cached ms', 'gain'))
+        for name in self.templates:
+            timings = [self.measure(lambda: engine.get_template(name), request, context, options['repeat'])
+                       for engine in (plain, cached)]
+            self.write_row(name, *timings)
+
+        self.stdout.write('{:<22} {:>12} {:>12} {:>8}'.format('', '{% url %} ms', 'prefix ms', 'gain'))
+        timings = [self.measure(lambda: template, request, context, options['repeat'])
+                   for template in (cached.from_string(URL_TAG_ROWS), cached.from_string(URL_TEMPLATE_ROWS))]
+        self.write_row('3 links x {} rows'.format(options['rows']), *timings)
+
+    def measure(self, get_template, request, context, repeat):
+        # медиана: единичные паузы сборщика мусора не влияют на результат
+        get_template().render(RequestContext(request, context))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            get_template().render(RequestContext(request, context))
+            timings.append((time.perf_counter() - started) * 1000)
+        return median(timings)
+
+    def write_row(self, name, before, after):
+        self.stdout.write('{:<22} {:>12.2f} {:>12.2f} {:>7.2f}x'.format(name, before, after, before / after))
+
+    def get_context(self, rows):
+        now = timezone.now()
+        category = Category(pk=1, name='Science')
+        articles = [Article(pk=pk, title='Article {}'.format(pk), text='Text', author='Author {}'.format(pk % 7),
+                            category=category, created_at=now, updated_at=now, comment_count=pk % 5,
+                            last_commented_at=now if pk % 2 else None)
+                    for pk in range(rows, 0, -1)]
+        comments = [Comment(pk=pk, article=articles[pk % len(articles)], text='Comment {}'.format(pk),
+                            author='Reader', created_at=now, updated_at=now)
+                    for pk in range(rows, 0, -1)]
+        page = SimpleNamespace(number=1, has_previous=False, previous_cursor=None, has_next=True,
+                               next_cursor='bmV4dA', next_pages=[(2, 'Mg'), (3, 'Mw')])
+        return {
+            'articles': articles,
+            'comments': comments,
+            'tag': Tag(pk=1, name='python', slug='python', article_count=rows),
+            'form': SimpleSearchForm(),
+            'is_paginated': True,
+            'page_obj': page,
+            'archived_count': rows,
+        }
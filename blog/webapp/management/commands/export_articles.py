@@ -0,0 +1,82 @@
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from webapp.models import Article, Comment
+
+
+ARTICLE_FIELDS = ('id', 'title', 'text', 'author', 'status', 'created_at', 'updated_at', 'category__name')
+COMMENT_FIELDS = ('article_id', 'author', 'text', 'created_at', 'updated_at')
+
+
+def dump_value(value):
+    # полная точность, без обрезки до миллисекунд как в DjangoJSONEncoder
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает статьи с комментариями и тегами в JSON Lines: одна статья на строку. ' \
+           'Читает базу порциями, поэтому память не зависит от объёма данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Файл для выгрузки, "-" - stdout')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options['batch_size'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                count = self.export(output, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS('Exported {} articles to {}.'.format(count,
+                                                                                   options['output'])))
+
+    def export(self, output, batch_size):
+        articles = Article.objects.order_by('pk').values_list(*ARTICLE_FIELDS).iterator(chunk_size=batch_size)
+        count = 0
+        for batch in chunks(articles, batch_size):
+            pks = [row[0] for row in batch]
+            comments = self.get_comments(pks)
+            tags = self.get_tags(pks)
+            for row in batch:
+                data = dict(zip(ARTICLE_FIELDS, row))
+                pk = data.pop('id')
+                data['category'] = data.pop('category__name')
+                data['tags'] = tags[pk]
+                data['comments'] = comments[pk]
+                output.write(json.dumps(data, default=dump_value, ensure_ascii=False) + '\n')
+            count += len(batch)
+        return count
+
+    def get_comments(self, pks):
+        comments = defaultdict(list)
+        rows = Comment.objects.filter(article_id__in=pks).order_by('article_id', 'created_at', 'pk') \
+            .values_list(*COMMENT_FIELDS)
+        for row in rows:
+            data = dict(zip(COMMENT_FIELDS, row))
+            comments[data.pop('article_id')].append(data)
+        return comments
+
+    def get_tags(self, pks):
+        tags = defaultdict(list)
+        rows = Article.tags.through.objects.filter(article_id__in=pks).order_by('article_id', 'tag__name') \
+            .values_list('article_id', 'tag__name')
+        for article_id, name in rows:
+            tags[article_id].append(name)
+        return tags
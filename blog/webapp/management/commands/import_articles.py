@@ -0,0 +1,173 @@
+import json
+import sys
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from webapp import caching, search, typeahead
+from webapp.models import Article, Comment, Category, Tag, Counter, STATUS_ACTIVE, STATUS_ARCHIVED, \
+    ARTICLE_STATUSES, ARCHIVED_ARTICLES_COUNTER, make_tag_slug
+from webapp.management.commands.export_articles import chunks
+
+
+# ограничение SQLite на число параметров в одном запросе
+LOOKUP_CHUNK_SIZE = 500
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """
+    Отключает auto_now/auto_now_add, чтобы bulk_create сохранил
+    время создания и изменения из выгрузки, а не текущее.
+    """
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if isinstance(field, DateTimeField) and (field.auto_now or field.auto_now_add)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Загружает статьи с комментариями и тегами из JSON Lines (формат export_articles). ' \
+           'Пишет пачками через bulk_create; статьи получают новые id после текущего максимума, ' \
+           'поэтому параллельно с другими записями статей запускать не стоит'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл JSON Lines, "-" - stdin')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.tag_ids = {}
+        self.category_ids = {}
+        self.statuses = {status for status, _ in ARTICLE_STATUSES}
+        if options['input'] == '-':
+            count = self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['input'], encoding='utf-8') as input_file:
+                count = self.load(input_file, options['batch_size'])
+        self.reset_sequences()
+        self.stdout.write(self.style.SUCCESS('Imported {} articles.'.format(count)))
+
+    def load(self, input_file, batch_size):
+        count = 0
+        with keep_timestamps(Article, Comment):
+            for batch in chunks(self.parse(input_file), batch_size):
+                self.import_batch(batch)
+                count += len(batch)
+                self.stdout.write('{} articles imported'.format(count))
+        return count
+
+    def parse(self, input_file):
+        for number, line in enumerate(input_file, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict) or not data.get('title') or not data.get('text'):
+                    raise ValueError('title and text are required')
+                if data.get('status', STATUS_ACTIVE) not in self.statuses:
+                    raise ValueError('unknown status {!r}'.format(data['status']))
+            except ValueError as e:
+                raise CommandError('Line {}: {}'.format(number, e))
+            yield data
+
+    def import_batch(self, batch):
+        now = timezone.now()
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids({name for data in batch for name in data.get('tags') or ()})
+            category_ids = self.get_category_ids({data['category'] for data in batch if data.get('category')})
+            start = (Article.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            articles, comments, tagged = [], [], []
+            archived = 0
+            for pk, data in enumerate(batch, start):
+                created_at = self.get_datetime(data.get('created_at'), now)
+                article_comments = [
+                    Comment(article_id=pk, author=comment.get('author'), text=comment.get('text', ''),
+                            created_at=self.get_datetime(comment.get('created_at'), now),
+                            updated_at=self.get_datetime(comment.get('updated_at'), now))
+                    for comment in data.get('comments') or ()
+                ]
+                articles.append(Article(
+                    pk=pk, title=data['title'], text=data['text'], author=data.get('author') or 'Unknown',
+                    status=data.get('status', STATUS_ACTIVE),
+                    category_id=category_ids.get(data.get('category')),
+                    created_at=created_at,
+                    updated_at=self.get_datetime(data.get('updated_at'), created_at),
+                    comment_count=len(article_comments),
+                    last_commented_at=max((comment.created_at for comment in article_comments), default=None),
+                ))
+                comments.extend(article_comments)
+                tagged.extend(Article.tags.through(article_id=pk, tag_id=tag_id)
+                              for tag_id in {tag_ids[make_tag_slug(name)] for name in data.get('tags') or ()})
+                archived += articles[-1].status == STATUS_ARCHIVED
+            Article.objects.bulk_create(articles)
+            Comment.objects.bulk_create(comments)
+            Article.tags.through.objects.bulk_create(tagged)
+            Tag.objects.filter(pk__in={row.tag_id for row in tagged}).refresh_article_counts()
+            Counter.increment(ARCHIVED_ARTICLES_COUNTER, archived)
+            search.index_articles([article.pk for article in articles])
+        caching.bump_articles_version()
+        caching.bump_tags_version()
+        for article in articles:
+            typeahead.update_article(article)
+
+    def get_tag_ids(self, names):
+        """
+        id тегов по слагу: уже встреченные берутся из памяти, остальные
+        ищутся в базе, недостающие создаются одним bulk_create.
+        """
+        names = {make_tag_slug(name): name for name in sorted(names)}
+        missing = sorted(names.keys() - self.tag_ids.keys())
+        if missing:
+            self.fetch_ids(Tag, 'slug', self.tag_ids, missing)
+            new = [Tag(name=names[slug], slug=slug) for slug in missing if slug not in self.tag_ids]
+            if new:
+                Tag.objects.bulk_create(new)
+                self.fetch_ids(Tag, 'slug', self.tag_ids, [tag.slug for tag in new])
+        return self.tag_ids
+
+    def get_category_ids(self, names):
+        missing = sorted(names - self.category_ids.keys())
+        if missing:
+            self.fetch_ids(Category, 'name', self.category_ids, missing)
+            new = [Category(name=name) for name in missing if name not in self.category_ids]
+            if new:
+                Category.objects.bulk_create(new)
+                self.fetch_ids(Category, 'name', self.category_ids, [category.name for category in new])
+        return self.category_ids
+
+    def fetch_ids(self, model, field, cache, values):
+        for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            rows = model.objects.filter(**{field + '__in': values[start:start + LOOKUP_CHUNK_SIZE]}) \
+                .order_by('pk').values_list(field, 'pk')
+            for value, pk in rows:
+                cache.setdefault(value, pk)
+
+    @staticmethod
+    def get_datetime(value, default):
+        if not value:
+            return default
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError('Invalid datetime: {}'.format(value))
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def reset_sequences(self):
+        # статьи вставлялись с явными id - на PostgreSQL и подобных сдвигаем последовательность
+        statements = connection.ops.sequence_reset_sql(no_style(), [Article])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from webapp import caching
+from webapp.models import Article, Tag, Counter, STATUS_ARCHIVED, ARCHIVED_ARTICLES_COUNTER
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики по данным в базе'
+
+    def handle(self, *args, **options):
+        archived = Article.objects.filter(status=STATUS_ARCHIVED).count()
+        Counter.set_value(ARCHIVED_ARTICLES_COUNTER, archived)
+        self.stdout.write('{}: {}'.format(ARCHIVED_ARTICLES_COUNTER, archived))
+        updated = Article.objects.refresh_comment_counters()
+        self.stdout.write('article comment counters: {}'.format(updated))
+        updated = Tag.objects.refresh_article_counts()
+        self.stdout.write('tag article counters: {}'.format(updated))
+        caching.bump_articles_version()
+        caching.bump_tags_version()
+        self.stdout.write(self.style.SUCCESS('Counters rebuilt.'))
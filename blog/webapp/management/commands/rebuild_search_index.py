@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс статей с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None, help='Алиас базы данных')
+
+    def handle(self, *args, **options):
+        if not search.rebuild(using=options['database']):
+            raise CommandError('Full-text index is not available for this database backend.')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from webapp import caching, routers
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик (sqlite3 backup API). ' \
+           'Для локальной проверки маршрутизации чтения; настоящие реплики ' \
+           'синхронизирует сам сервер БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять каждые N секунд (0 - один раз)')
+
+    def handle(self, *args, **options):
+        replicas = routers.get_replicas()
+        if not replicas:
+            raise CommandError('No replicas configured, set BLOG_DB_REPLICAS.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in replicas):
+            raise CommandError('sync_replicas only copies SQLite databases.')
+        while True:
+            self.sync(primary, replicas)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, primary, replicas):
+        primary.ensure_connection()
+        for alias in replicas:
+            # своё соединение с файлом реплики, чтобы backup не мешал открытому курсору Django
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write('{} -> {}'.format(DEFAULT_DB_ALIAS, alias))
+        # страницы, собранные с прежних копий, больше не используются
+        caching.bump_replica_generation()
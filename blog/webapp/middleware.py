@@ -0,0 +1,231 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from webapp import routers
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        self.statements[sql] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_duplicated(self, limit=3):
+        return [(sql, count) for sql, count in self.statements.most_common(limit) if count > 1]
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает SQL-запросы (и повторы одного и того же SQL) за время запроса
+    и сверяет их с бюджетом из settings.QUERY_BUDGETS для имени URL.
+    QUERY_BUDGET_ACTION: 'log' - писать предупреждение, 'raise' - падать,
+    None - не считать вовсе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        action = getattr(settings, 'QUERY_BUDGET_ACTION', None)
+        if not action:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        self.check_budget(request, recorder, action)
+        return response
+
+    def check_budget(self, request, recorder, action):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(match.view_name)
+        if not budget:
+            return
+        violations = []
+        if recorder.count > budget.get('queries', recorder.count):
+            violations.append('{} queries (budget {})'.format(recorder.count, budget['queries']))
+        if recorder.duplicates > budget.get('duplicates', recorder.duplicates):
+            violations.append('{} duplicate queries (budget {})'.format(recorder.duplicates,
+                                                                        budget['duplicates']))
+        if not violations:
+            return
+        message = '{} {}: {}'.format(match.view_name, request.get_full_path(), ', '.join(violations))
+        for sql, count in recorder.most_duplicated():
+            message += '\n  {}x {}'.format(count, sql)
+        if action == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view = None
+        self.render_started = None
+        self.render = None
+        self.sql = 0.0
+        self.sql_count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - started
+            self.sql_count += 1
+
+    def get_header(self):
+        finished = time.perf_counter()
+        if self.view is None and self.view_started is not None:
+            self.view = finished - self.view_started
+        metrics = [
+            ('view', self.view, None),
+            ('render', self.render, None),
+            ('sql', self.sql, '{} queries'.format(self.sql_count)),
+            ('total', finished - self.started, None),
+        ]
+        parts = []
+        for name, duration, description in metrics:
+            if duration is None:
+                continue
+            part = '{};dur={:.1f}'.format(name, duration * 1000)
+            if description:
+                part += ';desc="{}"'.format(description)
+            parts.append(part)
+        return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Раскладывает время запроса на view, рендеринг шаблона, SQL (время и
+    количество запросов) и общее время и отдаёт это в заголовке Server-Timing.
+    Ставится первым в MIDDLEWARE, чтобы total покрывал весь стек.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'SERVER_TIMING', False):
+            return self.get_response(request)
+        timings = RequestTimings()
+        request.server_timings = timings
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = self.get_response(request)
+        response['Server-Timing'] = timings.get_header()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = getattr(request, 'server_timings', None)
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, 'server_timings', None)
+        if timings is None or timings.view_started is None:
+            return response
+        timings.render_started = time.perf_counter()
+        timings.view = timings.render_started - timings.view_started
+
+        def finish_render(rendered_response):
+            timings.render = time.perf_counter() - timings.render_started
+
+        response.add_post_render_callback(finish_render)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Для staff-пользователей: ?_profile (или ?_profile=<ключ сортировки>)
+    выполняет запрос под cProfile и вместо страницы отдаёт самые горячие функции.
+    """
+    sort_keys = ('cumulative', 'tottime', 'calls', 'ncalls', 'time')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        param = getattr(settings, 'PROFILER_QUERY_PARAM', '_profile')
+        if param not in request.GET or not request.user.is_staff:
+            return self.get_response(request)
+        sort_key = request.GET.get(param)
+        if sort_key not in self.sort_keys:
+            sort_key = 'cumulative'
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        stream = io.StringIO()
+        stream.write('{} {} -> {}\n\n'.format(request.method, request.path, response.status_code))
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(sort_key).print_stats(getattr(settings, 'PROFILER_LIMIT', 30))
+        return HttpResponse(stream.getvalue(), content_type='text/plain; charset=utf-8')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    GET-запросы к представлениям из settings.REPLICA_READ_VIEWS читают
+    с реплики. После любого изменяющего запроса клиент получает cookie,
+    и REPLICA_PIN_SECONDS секунд все его чтения идут с основной базы -
+    так он сразу видит свой новый комментарий, даже если реплика отстаёт.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            request.replica_routing = stack
+            response = self.get_response(request)
+        if request.method not in self.safe_methods and routers.get_replicas():
+            seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+            response.set_cookie(self.get_cookie_name(), str(time.time() + seconds), max_age=seconds,
+                                httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in self.safe_methods or self.is_pinned(request):
+            return
+        if request.resolver_match.view_name not in getattr(settings, 'REPLICA_READ_VIEWS', ()):
+            return
+        # пользователь текущей сессии должен браться с основной базы
+        request.user.is_authenticated
+        request.replica_routing.enter_context(routers.read_from_replica())
+
+    def get_cookie_name(self):
+        return getattr(settings, 'REPLICA_PIN_COOKIE', 'primary_pin')
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.get_cookie_name(), 0)) > time.time()
+        except ValueError:
+            return False
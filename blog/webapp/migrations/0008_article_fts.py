@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+FTS_TABLE = 'webapp_article_fts'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE {} USING fts5("
+            "title, text, tags, comments, tokenize = 'unicode61 remove_diacritics 2')".format(FTS_TABLE)
+        )
+    except OperationalError:
+        # SQLite собран без FTS5 - поиск останется на LIKE.
+        return
+    schema_editor.execute(
+        "INSERT INTO {} (rowid, title, text, tags, comments) "
+        "SELECT a.id, a.title, a.text, "
+        "COALESCE((SELECT group_concat(t.name, ' ') FROM webapp_tag t "
+        "JOIN webapp_article_tags at ON at.tag_id = t.id WHERE at.article_id = a.id), ''), "
+        "COALESCE((SELECT group_concat(c.text, ' ') FROM webapp_comment c WHERE c.article_id = a.id), '') "
+        "FROM webapp_article a".format(FTS_TABLE)
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS {}'.format(FTS_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0007_auto_20191027_1708'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.5 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+def count_archived_articles(apps, schema_editor):
+    Article = apps.get_model('webapp', 'Article')
+    Counter = apps.get_model('webapp', 'Counter')
+    Counter.objects.create(name='archived_articles',
+                           value=Article.objects.filter(status='archived').count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0008_article_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+        ),
+        migrations.RunPython(count_archived_articles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.5 on 2026-10-18 02:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comment_counters(apps, schema_editor):
+    Article = apps.get_model('webapp', 'Article')
+    Comment = apps.get_model('webapp', 'Comment')
+    comments = Comment.objects.filter(article=OuterRef('pk')).order_by()
+    count = comments.values('article').annotate(count=Count('pk')).values('count')
+    last = comments.order_by('-created_at').values('created_at')[:1]
+    Article.objects.update(comment_count=Coalesce(Subquery(count), 0),
+                           last_commented_at=Subquery(last))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0009_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='last_commented_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.RunPython(fill_comment_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'updated_at'], name='comment_article_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+FTS_TABLE = 'webapp_article_fts'
+
+
+def make_slug(name):
+    return name.strip().lower()
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    Теги, чьи имена совпадают без учёта регистра и крайних пробелов,
+    сливаются в самый старый: статьи перевешиваются на него, дубликаты
+    удаляются. "C" и "C++" - разные теги.
+    """
+    Tag = apps.get_model('webapp', 'Tag')
+    Through = apps.get_model('webapp', 'Article').tags.through
+    alias = schema_editor.connection.alias
+    keepers = {}
+    merged_articles = set()
+    for tag in Tag.objects.using(alias).order_by('pk'):
+        slug = make_slug(tag.name)
+        keeper = keepers.setdefault(slug, tag)
+        if keeper.pk == tag.pk:
+            tag.slug = slug
+            tag.save(update_fields=['slug'])
+            continue
+        article_ids = set(Through.objects.using(alias).filter(tag_id=tag.pk).values_list('article_id', flat=True))
+        tagged = set(Through.objects.using(alias).filter(tag_id=keeper.pk, article_id__in=article_ids)
+                     .values_list('article_id', flat=True))
+        Through.objects.using(alias).bulk_create(
+            [Through(tag_id=keeper.pk, article_id=article_id) for article_id in article_ids - tagged])
+        Tag.objects.using(alias).filter(pk=tag.pk).delete()
+        merged_articles |= article_ids
+
+    count = Through.objects.using(alias).filter(tag=models.OuterRef('pk')).order_by() \
+        .values('tag').annotate(count=models.Count('pk')).values('count')
+    Tag.objects.using(alias).update(article_count=Coalesce(models.Subquery(count), 0))
+
+    connection = schema_editor.connection
+    if merged_articles and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            if FTS_TABLE not in connection.introspection.table_names(cursor):
+                return
+        pks = sorted(merged_articles)
+        for start in range(0, len(pks), 500):
+            batch = pks[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(batch))
+            schema_editor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), batch)
+            schema_editor.execute(
+                "INSERT INTO {} (rowid, title, text, tags, comments) "
+                "SELECT a.id, a.title, a.text, "
+                "COALESCE((SELECT group_concat(t.name, ' ') FROM webapp_tag t "
+                "JOIN webapp_article_tags at ON at.tag_id = t.id WHERE at.article_id = a.id), ''), "
+                "COALESCE((SELECT group_concat(c.text, ' ') FROM webapp_comment c WHERE c.article_id = a.id), '') "
+                "FROM webapp_article a WHERE a.id IN ({})".format(FTS_TABLE, placeholders), batch
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0012_comment_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='slug',
+            field=models.CharField(editable=False, max_length=50, null=True, verbose_name='Слаг'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Статей'),
+        ),
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.CharField(editable=False, max_length=50, unique=True, verbose_name='Слаг'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0013_tag_slug'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['author'], name='article_author_idx'),
+        ),
+    ]
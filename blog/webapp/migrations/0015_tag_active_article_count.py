@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_active_articles(apps, schema_editor):
+    """
+    Tag.article_count теперь считает только активные статьи -
+    как их показывает страница тега.
+    """
+    Tag = apps.get_model('webapp', 'Tag')
+    Through = apps.get_model('webapp', 'Article').tags.through
+    alias = schema_editor.connection.alias
+    count = Through.objects.using(alias).filter(tag=models.OuterRef('pk'), article__status='active').order_by() \
+        .values('tag').annotate(count=models.Count('pk')).values('count')
+    Tag.objects.using(alias).update(article_count=Coalesce(models.Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0014_article_author_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_active_articles, migrations.RunPython.noop),
+    ]
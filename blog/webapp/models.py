@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, IntegrityError, transaction
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 
 STATUS_ACTIVE = 'active'
@@ -8,6 +11,20 @@ ARTICLE_STATUSES = (
     (STATUS_ARCHIVED, 'Archived')
 )
 
+ARCHIVED_ARTICLES_COUNTER = 'archived_articles'
+
+# Поля, которые меняются только через update() с F() из обработчиков комментариев.
+ARTICLE_COUNTER_FIELDS = ('comment_count', 'last_commented_at')
+
+
+class ArticleQuerySet(models.QuerySet):
+    def refresh_comment_counters(self):
+        comments = Comment.objects.filter(article=OuterRef('pk')).order_by()
+        count = comments.values('article').annotate(count=Count('pk')).values('count')
+        last = comments.order_by('-created_at').values('created_at')[:1]
+        return self.update(comment_count=Coalesce(Subquery(count), 0),
+                           last_commented_at=Subquery(last))
+
 
 class Article(models.Model):
     title = models.CharField(max_length=200, null=False, blank=False, verbose_name='Заголовок')
@@ -19,10 +36,46 @@ class Article(models.Model):
                                  related_name='articles')
     tags = models.ManyToManyField('Tag', blank=True, related_name='articles', verbose_name='Теги')
     status = models.CharField(max_length=20, default=STATUS_ACTIVE, choices=ARTICLE_STATUSES, verbose_name='Статус')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Комментариев')
+    last_commented_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний комментарий')
+
+    objects = ArticleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # лента на главной и архив: частичные индексы под каждый статус
+            models.Index(fields=['created_at', 'id'], name='article_active_created_idx',
+                         condition=Q(status=STATUS_ACTIVE)),
+            models.Index(fields=['created_at', 'id'], name='article_archived_created_idx',
+                         condition=Q(status=STATUS_ARCHIVED)),
+            models.Index(fields=['last_commented_at', 'id'], name='article_active_activity_idx',
+                         condition=Q(status=STATUS_ACTIVE)),
+            # фильтр по автору и список авторов в админке
+            models.Index(fields=['author'], name='article_author_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # не перетираем счётчики комментариев значениями из устаревшего экземпляра
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ARTICLE_COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # статус на момент загрузки - чтобы счётчики видели смену статуса без лишнего запроса
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
     @property
     def is_active(self):
         return self.status == STATUS_ACTIVE
@@ -40,9 +93,35 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['article', 'created_at', 'id'], name='comment_article_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+            # последняя правка комментариев статьи - для ETag/Last-Modified в API
+            models.Index(fields=['article', 'updated_at'], name='comment_article_updated_idx'),
+        ]
+
     def __str__(self):
         return self.text[:20]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'article_id' in field_names:
+            instance._loaded_article_id = values[field_names.index('article_id')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_article_id = self.article_id
+
+    def get_article_ids(self):
+        """
+        Статьи, которых коснулось сохранение: текущая и та, к которой
+        комментарий был привязан при загрузке (если его перенесли).
+        """
+        return {self.article_id, getattr(self, '_loaded_article_id', self.article_id)}
+
 
 class Category(models.Model):
     name = models.CharField(max_length=20, verbose_name='Название')
@@ -51,9 +130,67 @@ class Category(models.Model):
         return self.name
 
 
+def make_tag_slug(name):
+    """
+    Нормальная форма имени тега: "Django", "django" и " DJANGO " - один тег.
+    Знаки не выбрасываются, так что "C", "C++" и "C#" остаются разными.
+    """
+    return name.strip().lower()
+
+
+class TagQuerySet(models.QuerySet):
+    def refresh_article_counts(self):
+        # считаются только активные статьи - те же, что видны на странице тега
+        through = Article.tags.through.objects.filter(tag=OuterRef('pk'), article__status=STATUS_ACTIVE) \
+            .order_by()
+        count = through.values('tag').annotate(count=Count('pk')).values('count')
+        return self.update(article_count=Coalesce(Subquery(count), 0))
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=31, verbose_name='Тег')
+    slug = models.CharField(max_length=50, unique=True, editable=False, verbose_name='Слаг')
+    article_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Статей')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
 
+    objects = TagQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        slug = make_tag_slug(self.name)
+        if Tag.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': 'Такой тег уже есть.'})
+
+    def save(self, *args, **kwargs):
+        self.slug = make_tag_slug(self.name)
+        super().save(*args, **kwargs)
+
+
+class Counter(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name='Название')
+    value = models.IntegerField(default=0, verbose_name='Значение')
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return '{}: {}'.format(self.name, self.value)
+
+    @classmethod
+    def get_value(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def increment(cls, name, delta=1):
+        if not delta:
+            return
+        if cls.objects.filter(name=name).update(value=F('value') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, value=delta)
+        except IntegrityError:
+            cls.objects.filter(name=name).update(value=F('value') + delta)
+
+    @classmethod
+    def set_value(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={'value': value})
@@ -0,0 +1,212 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод по ключу сортировки (keyset) вместо OFFSET/LIMIT.
+    Страница выбирается условием "после строки с такими-то ключами",
+    поэтому тысячная страница стоит столько же, сколько первая,
+    а общее количество строк (COUNT) не считается вовсе.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-created_at', '-pk'), window=5):
+        self.ordering = tuple(ordering)
+        self.object_list = object_list.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self.window = window
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def page(self, cursor=None):
+        position, number, backwards = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if position is not None:
+            queryset = queryset.filter(self.get_position_query(position, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return CursorPage(rows, number, self, has_next=True, has_previous=has_more)
+        return CursorPage(rows, number, self, has_next=has_more, has_previous=position is not None)
+
+    def get_position_query(self, position, backwards=False):
+        query = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            lookup = 'gt' if descending == backwards else 'lt'
+            condition = Q(**{'{}__{}'.format(name, lookup): position[index]})
+            for previous_index, (previous_name, _) in enumerate(self.keys[:index]):
+                condition &= Q(**{previous_name: position[previous_index]})
+            query |= condition
+        # избыточное нестрогое условие по первому ключу даёт базе поиск
+        # по диапазону индекса вместо просмотра с начала
+        name, descending = self.keys[0]
+        lookup = 'gte' if descending == backwards else 'lte'
+        return Q(**{'{}__{}'.format(name, lookup): position[0]}) & query
+
+    def get_position(self, obj):
+        if isinstance(obj, (tuple, list)):
+            return list(obj)
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self.keys]
+        return [getattr(obj, name) for name, _ in self.keys]
+
+    def get_lookahead(self, position):
+        """
+        Ключи строк, идущих сразу за position, - ровно столько, сколько нужно,
+        чтобы построить ссылки на следующие self.window страниц.
+        """
+        names = [name for name, _ in self.keys]
+        queryset = self.object_list.filter(self.get_position_query(position))
+        return list(queryset.values_list(*names)[:self.per_page * (self.window - 1) + 1])
+
+    def encode_cursor(self, position, number, backwards=False):
+        data = {
+            'k': [self.dump_value(value) for value in position],
+            'n': number,
+        }
+        if backwards:
+            data['b'] = 1
+        raw = json.dumps(data, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, 1, False
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw.decode())
+            values = data['k']
+            number = int(data['n'])
+            backwards = bool(data.get('b'))
+            if len(values) != len(self.keys) or number < 1:
+                raise InvalidCursor('Cursor does not match the ordering')
+            position = [self.load_value(name, value) for (name, _), value in zip(self.keys, values)]
+        except (ValueError, TypeError, KeyError, binascii.Error, ValidationError) as e:
+            raise InvalidCursor('Invalid cursor') from e
+        return position, number, backwards
+
+    @staticmethod
+    def dump_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+    def load_value(self, name, value):
+        """
+        Значение ключа из курсора. Всё, что не даст условия для filter()
+        (null, списки, объекты, true/false), - InvalidCursor, а не ошибка
+        при построении запроса.
+        """
+        if value is None or isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise InvalidCursor('Invalid cursor value')
+        opts = self.object_list.model._meta
+        try:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+        except FieldDoesNotExist:
+            # аннотация, например ранг полнотекстового поиска
+            return value
+        try:
+            value = field.to_python(value)
+        except (ValidationError, ValueError, TypeError) as e:
+            raise InvalidCursor('Invalid cursor value') from e
+        if value is None:
+            raise InvalidCursor('Invalid cursor value')
+        return value
+
+
+class CursorPage:
+    def __init__(self, object_list, number, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Page {}>'.format(self.number)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        position = self.paginator.get_position(self.object_list[-1])
+        return self.paginator.encode_cursor(position, self.number + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous or self.number <= 2:
+            return None
+        position = self.paginator.get_position(self.object_list[0])
+        return self.paginator.encode_cursor(position, self.number - 1, backwards=True)
+
+    @cached_property
+    def next_pages(self):
+        """
+        Ограниченное окно ссылок вперёд: (номер страницы, курсор).
+        """
+        if not self._has_next:
+            return []
+        pages = [(self.number + 1, self.next_cursor)]
+        position = self.paginator.get_position(self.object_list[-1])
+        lookahead = self.paginator.get_lookahead(position)
+        per_page = self.paginator.per_page
+        for offset in range(1, self.paginator.window):
+            last_index = per_page * offset - 1
+            if len(lookahead) <= last_index + 1:
+                break
+            number = self.number + 1 + offset
+            pages.append((number, self.paginator.encode_cursor(lookahead[last_index], number)))
+        return pages
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Обычный постраничный вывод (для админки), но COUNT по одному и тому же
+    запросу считается не чаще раза в ADMIN_COUNT_CACHE_TIMEOUT секунд:
+    на больших таблицах это самый дорогой запрос страницы.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return len(self.object_list)
+        sql, params = query.sql_with_params()
+        key = 'webapp:count:{}:{}'.format(self.object_list.db, hashlib.md5(
+            '{}|{!r}'.format(sql, params).encode()).hexdigest())
+        return cache.get_or_set(key, self.object_list.count, getattr(settings, 'ADMIN_COUNT_CACHE_TIMEOUT', 60))
@@ -0,0 +1,64 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_reads_enabled():
+    return getattr(_state, 'replica', None) is not None
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Внутри блока чтения идут на одну из реплик (одну и ту же до конца блока),
+    если реплики настроены. Запись всегда идёт на основную базу.
+    """
+    replicas = get_replicas()
+    previous = getattr(_state, 'replica', None)
+    _state.replica = random.choice(replicas) if replicas else None
+    try:
+        yield _state.replica
+    finally:
+        _state.replica = previous
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение - с реплики только там, где его явно разрешили через
+    read_from_replica() (списочные и детальные страницы), всё остальное -
+    с основной базы. Сессии всегда читаются с основной: реплика может
+    ещё не знать о только что созданной сессии.
+    """
+    primary_only_apps = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica is None or model._meta.app_label in self.primary_only_apps:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же данные, что и на основной базе
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема попадает на реплики вместе с данными при синхронизации
+        if db in get_replicas():
+            return False
+        return None
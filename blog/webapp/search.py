@@ -0,0 +1,130 @@
+import re
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from webapp.models import Article
+
+
+FTS_TABLE = 'webapp_article_fts'
+TEXT_COLUMNS = ('title', 'text', 'comments')
+TAG_COLUMN = 'tags'
+
+# Индекс хранит по одной строке на статью: rowid совпадает с pk статьи,
+# теги и тексты комментариев склеены в отдельные колонки.
+INDEX_ROWS_SQL = '''
+    SELECT a.id, a.title, a.text,
+           COALESCE((SELECT group_concat(t.name, ' ')
+                     FROM webapp_tag t
+                     JOIN webapp_article_tags at ON at.tag_id = t.id
+                     WHERE at.article_id = a.id), ''),
+           COALESCE((SELECT group_concat(c.text, ' ')
+                     FROM webapp_comment c
+                     WHERE c.article_id = a.id), '')
+    FROM webapp_article a
+'''
+
+BATCH_SIZE = 500
+
+_available = set()
+
+
+def get_alias():
+    return router.db_for_write(Article)
+
+
+def is_available(using=None):
+    using = using or get_alias()
+    if using in _available:
+        return True
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        if FTS_TABLE in connection.introspection.table_names(cursor):
+            _available.add(using)
+            return True
+    return False
+
+
+def quote(word):
+    return '"{}"'.format(word.replace('"', '""'))
+
+
+def match_expression(text, columns):
+    """
+    Собирает запрос FTS5 MATCH по выбранным колонкам.
+    В заголовке, тексте и комментариях слова ищутся по префиксу,
+    в тегах - целой фразой, как раньше искалось по имени тега.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    parts = []
+    text_columns = [column for column in TEXT_COLUMNS if column in columns]
+    if text_columns:
+        terms = ' '.join(quote(word) + '*' for word in words)
+        parts.append('({{{}}} : {})'.format(' '.join(text_columns), terms))
+    if TAG_COLUMN in columns:
+        parts.append('({} : {})'.format(TAG_COLUMN, quote(' '.join(words))))
+    if not parts:
+        return None
+    return ' OR '.join(parts)
+
+
+def filter_queryset(queryset, text, columns):
+    """
+    Отбирает статьи по индексу и сортирует их по релевантности (bm25).
+    Возвращает None, если индекс недоступен и искать нужно по-старому.
+    """
+    if not is_available(queryset.db):
+        return None
+    expression = match_expression(text, columns)
+    if expression is None:
+        return None
+    # один проход по индексу вместо MATCH на каждую найденную статью:
+    # таблица индекса присоединяется по rowid, ранг берётся из её колонки
+    table = Article._meta.db_table
+    joined = '{fts}.rowid = "{table}"."id"'.format(fts=FTS_TABLE, table=table)
+    matched = '{fts} MATCH %s'.format(fts=FTS_TABLE)
+    rank = RawSQL('{}.rank'.format(FTS_TABLE), [])
+    return queryset.extra(tables=[FTS_TABLE], where=[joined, matched], params=[expression]) \
+        .annotate(search_rank=rank).order_by('search_rank', '-created_at')
+
+
+def _batches(pks):
+    pks = sorted({pk for pk in pks if pk is not None})
+    for start in range(0, len(pks), BATCH_SIZE):
+        batch = pks[start:start + BATCH_SIZE]
+        yield batch, ', '.join(['%s'] * len(batch))
+
+
+def index_articles(pks, using=None):
+    using = using or get_alias()
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for batch, placeholders in _batches(pks):
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), batch)
+            cursor.execute('INSERT INTO {} (rowid, title, text, tags, comments) {} WHERE a.id IN ({})'
+                           .format(FTS_TABLE, INDEX_ROWS_SQL, placeholders), batch)
+
+
+def remove_articles(pks, using=None):
+    using = using or get_alias()
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for batch, placeholders in _batches(pks):
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), batch)
+
+
+def rebuild(using=None):
+    using = using or get_alias()
+    if not is_available(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        cursor.execute('INSERT INTO {} (rowid, title, text, tags, comments) {}'
+                       .format(FTS_TABLE, INDEX_ROWS_SQL))
+    return True
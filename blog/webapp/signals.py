@@ -0,0 +1,202 @@
+from django.db.models import F, OuterRef, Subquery, Value, DateTimeField
+from django.db.models.functions import Coalesce, Greatest
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from webapp import caching, db, search, typeahead
+from webapp.models import Article, Comment, Tag, Category, Counter, STATUS_ACTIVE, STATUS_ARCHIVED, \
+    ARCHIVED_ARTICLES_COUNTER
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    db.configure_connection(connection)
+
+
+@receiver(post_save, sender=Article)
+def index_saved_article(sender, instance, **kwargs):
+    search.index_articles([instance.pk], using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Article)
+def unindex_deleted_article(sender, instance, **kwargs):
+    search.remove_articles([instance.pk], using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Article)
+def update_typeahead(sender, instance, **kwargs):
+    typeahead.update_article(instance)
+
+
+@receiver(post_delete, sender=Article)
+def remove_from_typeahead(sender, instance, **kwargs):
+    typeahead.remove_article(instance.pk)
+
+
+@receiver(post_save, sender=Article)
+def count_saved_archived_article(sender, instance, created, **kwargs):
+    if created:
+        old_status = None
+    elif hasattr(instance, '_loaded_status'):
+        old_status = instance._loaded_status
+    else:
+        return
+    delta = (instance.status == STATUS_ARCHIVED) - (old_status == STATUS_ARCHIVED)
+    Counter.increment(ARCHIVED_ARTICLES_COUNTER, delta)
+    instance._loaded_status = instance.status
+    if delta and not created:
+        # счётчики тегов учитывают только активные статьи
+        Tag.objects.using(kwargs.get('using')).filter(articles=instance).refresh_article_counts()
+        caching.bump_tags_version()
+
+
+@receiver(post_delete, sender=Article)
+def count_deleted_archived_article(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_status', instance.status) == STATUS_ARCHIVED:
+        Counter.increment(ARCHIVED_ARTICLES_COUNTER, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reindex_commented_article(sender, instance, **kwargs):
+    search.index_articles(instance.get_article_ids(), using=kwargs.get('using'))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_articles(sender, instance, **kwargs):
+    instance._article_pks = list(instance.articles.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reindex_tagged_articles(sender, instance, **kwargs):
+    pks = getattr(instance, '_article_pks', None)
+    if pks is None:
+        pks = instance.articles.values_list('pk', flat=True)
+    search.index_articles(pks, using=kwargs.get('using'))
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def reindex_retagged_articles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_articles([instance.pk], using=kwargs.get('using'))
+    elif action == 'pre_clear':
+        instance._article_pks = list(instance.articles.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        search.index_articles(pk_set, using=kwargs.get('using'))
+    elif action == 'post_clear':
+        search.index_articles(getattr(instance, '_article_pks', []), using=kwargs.get('using'))
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def count_tagged_articles(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Счётчик активных статей у тегов: при добавлении - прибавляем через F(),
+    при снятии пересчитываем затронутые теги по индексу связующей таблицы
+    (в pk_set при remove могут быть и id, которых не было).
+    """
+    tags = Tag.objects.using(using)
+    if action == 'pre_clear':
+        instance._cleared_tag_pks = [instance.pk] if reverse else \
+            list(instance.tags.using(using).values_list('pk', flat=True))
+        return
+    if action == 'post_add':
+        if reverse:
+            added = Article.objects.using(using).filter(pk__in=pk_set, status=STATUS_ACTIVE).count()
+            tags.filter(pk=instance.pk).update(article_count=F('article_count') + added)
+        elif instance.status == STATUS_ACTIVE:
+            tags.filter(pk__in=pk_set).update(article_count=F('article_count') + 1)
+    elif action == 'post_remove':
+        tags.filter(pk__in=[instance.pk] if reverse else pk_set).refresh_article_counts()
+    elif action == 'post_clear':
+        tags.filter(pk__in=getattr(instance, '_cleared_tag_pks', [])).refresh_article_counts()
+    else:
+        return
+    caching.bump_tags_version()
+
+
+@receiver(pre_delete, sender=Article)
+def remember_article_tags(sender, instance, using, **kwargs):
+    instance._tag_pks = list(instance.tags.using(using).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Article)
+def count_deleted_article_tags(sender, instance, using, **kwargs):
+    if getattr(instance, '_tag_pks', None):
+        Tag.objects.using(using).filter(pk__in=instance._tag_pks).refresh_article_counts()
+        caching.bump_tags_version()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, instance, **kwargs):
+    caching.bump_tags_version()
+
+
+# Версии в кэше меняются только после COMMIT: сменись они раньше, читатель
+# успел бы положить под новую версию ещё не изменённое состояние, и оно
+# жило бы в кэше до следующей записи. Вне транзакции on_commit срабатывает сразу.
+
+@receiver(post_save, sender=Article)
+def refresh_article_version(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: caching.set_article_version(instance), using=using)
+
+
+@receiver(post_delete, sender=Article)
+def forget_article_fragments(sender, instance, using, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: caching.forget_article(pk), using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_page_version(sender, instance, using, **kwargs):
+    article_ids = instance.get_article_ids()
+
+    def bump():
+        for article_id in article_ids:
+            caching.bump_comments_version(article_id)
+
+    transaction.on_commit(bump, using=using)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_articles_version(sender, instance, using, **kwargs):
+    transaction.on_commit(caching.bump_articles_version, using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_categories_version(sender, instance, using, **kwargs):
+    transaction.on_commit(caching.bump_categories_version, using=using)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, using, **kwargs):
+    articles = Article.objects.using(using)
+    if created:
+        commented_at = Value(instance.created_at, output_field=DateTimeField())
+        articles.filter(pk=instance.article_id).update(
+            comment_count=F('comment_count') + 1,
+            last_commented_at=Coalesce(Greatest('last_commented_at', commented_at), commented_at),
+        )
+    else:
+        article_ids = instance.get_article_ids()
+        if len(article_ids) > 1:
+            articles.filter(pk__in=article_ids).refresh_comment_counters()
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, using, **kwargs):
+    last = Comment.objects.using(using).filter(article=OuterRef('pk')) \
+        .order_by('-created_at').values('created_at')[:1]
+    Article.objects.using(using).filter(pk=instance.article_id).update(
+        comment_count=Greatest(F('comment_count') - 1, 0),
+        last_commented_at=Subquery(last),
+    )
@@ -0,0 +1,181 @@
+import gzip
+import json
+import mimetypes
+import os
+import shutil
+from email.utils import formatdate, parsedate_to_datetime
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.map')
+# меньше этого gzip почти ничего не даёт
+MIN_COMPRESS_SIZE = 256
+BLOCK_SIZE = 64 * 1024
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic пишет файлы с хэшем содержимого в имени (style.3f2a...css)
+    и рядом - сжатые варианты .gz для текстовых файлов.
+    Пока collectstatic не запускался (разработка, тесты), {% static %}
+    отдаёт имена без хэша вместо ошибки об отсутствующем манифесте.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(self.path(name))
+
+    @staticmethod
+    def compress(path):
+        if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            return
+        compressed_path = path + '.gz'
+        with open(path, 'rb') as source, open(compressed_path, 'wb') as target:
+            # mtime=0 - одинаковый файл при каждой сборке
+            with gzip.GzipFile(filename='', mode='wb', fileobj=target, compresslevel=9, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed)
+        if os.path.getsize(compressed_path) >= os.path.getsize(path):
+            os.remove(compressed_path)
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Разбор Accept-Encoding с весами q: "gzip;q=0" - явный отказ,
+    "*" покрывает gzip, только если тот не назван отдельно.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class StaticFile:
+    def __init__(self, path, immutable, content_type=None, mtime=None, suffix=''):
+        self.path = path
+        self.immutable = immutable
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime = mtime or int(stat.st_mtime)
+        self.content_type = content_type or self.guess_type(path)
+        self.etag = '"{:x}-{:x}{}"'.format(self.mtime, self.size, suffix)
+        self.compressed = None
+        if not suffix and os.path.isfile(path + '.gz'):
+            self.compressed = StaticFile(path + '.gz', immutable, self.content_type, self.mtime, '-gz')
+
+    @staticmethod
+    def guess_type(path):
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        return content_type
+
+
+class StaticFilesApplication:
+    """
+    WSGI-обёртка, которая отдаёт собранную статику из STATIC_ROOT, не доходя
+    до Django. Список файлов строится один раз при старте (после
+    collectstatic файлы не меняются), поэтому путь из запроса в файловую
+    систему не попадает. Файлы с хэшем в имени кэшируются навсегда,
+    остальные - на STATIC_MAX_AGE; сжатый вариант отдаётся, если клиент
+    принимает gzip с ненулевым q. Тело - через wsgi.file_wrapper сервера
+    (sendfile).
+    """
+    immutable_max_age = 60 * 60 * 24 * 365
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = self.scan() if self.root and os.path.isdir(self.root) else {}
+
+    def scan(self):
+        hashed = set()
+        manifest = os.path.join(self.root, CompressedManifestStaticFilesStorage.manifest_name)
+        if os.path.isfile(manifest):
+            with open(manifest, encoding='utf-8') as manifest_file:
+                hashed = set(json.load(manifest_file).get('paths', {}).values())
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not name.endswith('.gz'):
+                    files[self.prefix + relative] = StaticFile(path, relative in hashed)
+        return files
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not self.files or not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+        method = environ.get('REQUEST_METHOD', 'GET')
+        static_file = self.files.get(path)
+        if static_file is None or method not in ('GET', 'HEAD'):
+            status = '404 Not Found' if static_file is None else '405 Method Not Allowed'
+            start_response(status, [('Content-Type', 'text/plain'), ('Content-Length', str(len(status)))])
+            return [status.encode()]
+        return self.serve(static_file, environ, start_response, method == 'HEAD')
+
+    def serve(self, static_file, environ, start_response, head):
+        headers = [('Cache-Control', self.get_cache_control(static_file)),
+                   ('Last-Modified', formatdate(static_file.mtime, usegmt=True))]
+        if static_file.compressed is not None:
+            headers.append(('Vary', 'Accept-Encoding'))
+            if accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING', '')):
+                static_file = static_file.compressed
+                headers.append(('Content-Encoding', 'gzip'))
+        headers.append(('ETag', static_file.etag))
+        if self.is_not_modified(static_file, environ):
+            start_response('304 Not Modified', headers)
+            return []
+        headers += [('Content-Type', static_file.content_type), ('Content-Length', str(static_file.size))]
+        start_response('200 OK', headers)
+        if head:
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(static_file.path, 'rb'), BLOCK_SIZE)
+
+    def get_cache_control(self, static_file):
+        if static_file.immutable:
+            return 'public, max-age={}, immutable'.format(self.immutable_max_age)
+        return 'public, max-age={}'.format(getattr(settings, 'STATIC_MAX_AGE', 60))
+
+    @staticmethod
+    def is_not_modified(static_file, environ):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return static_file.etag in [tag.strip() for tag in if_none_match.split(',')] \
+                or if_none_match.strip() == '*'
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= static_file.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
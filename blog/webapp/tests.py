@@ -1,3 +1,1233 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User, AnonymousUser, Permission
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, OperationalError
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.db.models.signals import post_save
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, resolve, NoReverseMatch
+from django.utils.timezone import make_aware
+
+from webapp import bulk, search, typeahead
+from webapp.db import retry_on_lock, configure_connection
+from webapp.forms import FullSearchForm
+from webapp.middleware import QueryBudgetExceeded, ReplicaRoutingMiddleware
+from webapp.models import Article, Comment, Category, Tag, Counter, STATUS_ARCHIVED, STATUS_ACTIVE, \
+    ARCHIVED_ARTICLES_COUNTER
+from webapp.pagination import CursorPaginator, InvalidCursor
+from webapp.static_assets import StaticFilesApplication
+from webapp.views import SearchResultsView
+
+
+@contextmanager
+def run_commit_callbacks(using=DEFAULT_DB_ALIAS):
+    """
+    TestCase не делает COMMIT, поэтому колбэки transaction.on_commit,
+    накопленные внутри блока, выполняются на выходе из него вручную.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, func in callbacks:
+        func()
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        if not search.is_available():
+            self.skipTest('SQLite собран без FTS5')
+        self.exact = Article.objects.create(title='Python generators', text='Python generators explained with python')
+        self.passing = Article.objects.create(title='Weekly notes',
+                                              text='Release notes, meetings, a short python remark and more news')
+        self.other = Article.objects.create(title='Djangonaut diary', text='Nothing to see')
+
+    def find(self, text, columns=('title', 'text')):
+        return list(search.filter_queryset(Article.objects.all(), text, columns))
+
+    def test_ranking_puts_best_match_first(self):
+        self.assertEqual(self.find('python'), [self.exact, self.passing])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.find('djang'), [self.other])
+        self.assertEqual(self.find('gener pyth'), [self.exact])
+        self.assertEqual(self.find('djang', columns=['text']), [])
+
+    def test_index_follows_comments_and_tags(self):
+        self.other.comments.create(text='Brilliant walkthrough')
+        self.other.tags.add(Tag.objects.create(name='web dev'))
+        self.assertEqual(self.find('brill', columns=['comments']), [self.other])
+        self.assertEqual(self.find('web dev', columns=['tags']), [self.other])
+        self.assertEqual(self.find('dev web', columns=['tags']), [])
+        self.other.delete()
+        self.assertEqual(self.find('brill', columns=['comments']), [])
+
+    def test_results_page_is_ranked(self):
+        response = self.client.get(reverse('webapp:search_results'),
+                                   {'text': 'python', 'in_title': 'on', 'in_text': 'on'})
+        self.assertEqual(list(response.context['articles']), [self.exact, self.passing])
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles = [Article.objects.create(title='Paged article {}'.format(i), text='Text') for i in range(12)]
+        # одинаковое время у нескольких статей: порядок внутри решает pk
+        Article.objects.filter(pk__in=[article.pk for article in cls.articles[4:8]]) \
+            .update(created_at=cls.articles[4].created_at)
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Article.objects.all(), 5)
+        self.expected = list(Article.objects.order_by('-created_at', '-pk'))
+
+    def test_pages_follow_each_other(self):
+        first = self.paginator.page()
+        second = self.paginator.page(first.next_cursor)
+        third = self.paginator.page(second.next_cursor)
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+        self.assertEqual([page.number for page in (first, second, third)], [1, 2, 3])
+        self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+        self.assertEqual((third.has_previous(), third.has_next()), (True, False))
+        self.assertIsNone(third.next_cursor)
+
+    def test_previous_pages(self):
+        second = self.paginator.page(self.paginator.page().next_cursor)
+        third = self.paginator.page(second.next_cursor)
+        # на первую страницу ведёт ссылка без курсора
+        self.assertIsNone(second.previous_cursor)
+        back = self.paginator.page(third.previous_cursor)
+        self.assertEqual((back.number, list(back)), (2, list(second)))
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_next_pages_window(self):
+        first = self.paginator.page()
+        self.assertEqual([number for number, _ in first.next_pages], [2, 3])
+        for number, cursor in first.next_pages:
+            page = self.paginator.page(cursor)
+            self.assertEqual(page.number, number)
+            self.assertEqual(list(page), self.expected[(number - 1) * 5:number * 5])
+        paginator = CursorPaginator(Article.objects.all(), 2, window=3)
+        self.assertEqual([number for number, _ in paginator.page().next_pages], [2, 3, 4])
+
+    def test_cursor_round_trip(self):
+        article = self.articles[5]
+        cursor = self.paginator.encode_cursor([article.created_at, article.pk], 4, backwards=True)
+        self.assertEqual(self.paginator.decode_cursor(cursor), ([article.created_at, article.pk], 4, True))
+        self.assertEqual(self.paginator.decode_cursor(None), (None, 1, False))
+
+    def test_invalid_cursor(self):
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for cursor in ['garbage', '!!!', encode([1, 2]), encode({'k': [1], 'n': 2}),
+                       encode({'k': ['2020-01-01T00:00:00', 1], 'n': 0}),
+                       encode({'k': ['not a date', 1], 'n': 2}),
+                       encode({'k': [None, 1], 'n': 2}), encode({'k': ['2020-01-01T00:00:00', None], 'n': 2}),
+                       encode({'k': [[], 1], 'n': 2}), encode({'k': ['2020-01-01T00:00:00', {'a': 1}], 'n': 2}),
+                       encode({'k': ['2020-01-01T00:00:00', True], 'n': 2}),
+                       encode({'k': ['2020-01-01T00:00:00', 'seven'], 'n': 2}), encode({'k': [1.5, 1], 'n': 2})]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    self.paginator.page(cursor)
+        ranked = CursorPaginator(Article.objects.all(), 5, ('search_rank', '-pk'))
+        for value in ([1], {'rank': 1}, None, False):
+            with self.subTest(rank=value):
+                with self.assertRaises(InvalidCursor):
+                    ranked.decode_cursor(encode({'k': [value, 1], 'n': 2}))
+
+        cursor = encode({'k': [None, 1], 'n': 2})
+        for name, params in (('webapp:index', {}), ('webapp:comment_list', {}), ('webapp:archive', {}),
+                             ('webapp:api_article_list', {}),
+                             ('webapp:search_results', {'text': 'paged', 'in_title': 'on'})):
+            with self.subTest(name=name):
+                for value in (cursor, 'garbage'):
+                    response = self.client.get(reverse(name), dict(params, cursor=value))
+                    self.assertEqual(response.status_code, 404)
+
+
+class ArchiveTest(TestCase):
+    def create(self, title, year, month, status=STATUS_ARCHIVED):
+        article = Article.objects.create(title=title, text='Text', status=status)
+        Article.objects.filter(pk=article.pk).update(created_at=make_aware(datetime(year, month, 15)))
+        return article
+
+    def get_titles(self, name, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs))
+        return [article.title for article in response.context['articles']]
+
+    def test_period_buckets(self):
+        self.create('March 2020', 2020, 3)
+        self.create('December 2020', 2020, 12)
+        self.create('January 2021', 2021, 1)
+        self.create('Active March 2020', 2020, 3, status=STATUS_ACTIVE)
+        self.assertEqual(self.get_titles('webapp:archive'), ['January 2021', 'December 2020', 'March 2020'])
+        self.assertEqual(self.get_titles('webapp:archive_year', year=2020), ['December 2020', 'March 2020'])
+        self.assertEqual(self.get_titles('webapp:archive_month', year=2020, month=3), ['March 2020'])
+        self.assertEqual(self.get_titles('webapp:archive_month', year=2020, month=12), ['December 2020'])
+        self.assertEqual(self.get_titles('webapp:archive_month', year=2020, month=5), [])
+        response = self.client.get(reverse('webapp:archive_month', kwargs={'year': 2020, 'month': 13}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_counter_follows_status(self):
+        def archived_count():
+            return self.client.get(reverse('webapp:archive')).context['archived_count']
+
+        article = Article.objects.create(title='Counted article', text='Text', status=STATUS_ARCHIVED)
+        self.assertEqual(archived_count(), 1)
+        article.status = STATUS_ACTIVE
+        article.save()
+        self.assertEqual(archived_count(), 0)
+        article = Article.objects.get(pk=article.pk)
+        article.status = STATUS_ARCHIVED
+        article.save()
+        article.save()
+        self.assertEqual(archived_count(), 1)
+        Article.objects.create(title='Active article', text='Text').delete()
+        self.assertEqual(archived_count(), 1)
+        article.delete()
+        self.assertEqual(archived_count(), 0)
+        self.assertEqual(Counter.get_value(ARCHIVED_ARTICLES_COUNTER), 0)
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Cached category')
+        self.article = Article.objects.create(title='Cached article', text='Cached body', category=self.category)
+        self.comment = self.article.comments.create(text='Cached comment')
+        self.url = reverse('webapp:article_view', kwargs={'pk': self.article.pk})
+
+    def get(self):
+        return self.client.get(self.url)
+
+    def test_second_view_is_served_from_cache(self):
+        self.get()
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertContains(response, 'Cached body')
+        self.assertContains(response, 'Cached comment')
+
+    def test_article_write_invalidates_body(self):
+        self.get()
+        self.article.text = 'Edited body'
+        with run_commit_callbacks():
+            self.article.save()
+        self.assertContains(self.get(), 'Edited body')
+
+    def test_comment_writes_invalidate_comment_page(self):
+        self.get()
+        with run_commit_callbacks():
+            self.article.comments.create(text='Fresh comment')
+        self.assertContains(self.get(), 'Fresh comment')
+        self.comment.text = 'Edited comment'
+        with run_commit_callbacks():
+            self.comment.save()
+        self.assertContains(self.get(), 'Edited comment')
+        with run_commit_callbacks():
+            self.comment.delete()
+        self.assertNotContains(self.get(), 'Edited comment')
+
+    def test_category_rename_invalidates_body(self):
+        self.get()
+        self.category.name = 'Renamed category'
+        with run_commit_callbacks():
+            self.category.save()
+        self.assertContains(self.get(), 'Renamed category')
+
+    def test_uncommitted_write_keeps_cache(self):
+        self.get()
+        self.article.comments.create(text='Not committed yet')
+        # колбэк on_commit ещё не выполнен - в кэше прежняя страница
+        with self.assertNumQueries(0):
+            self.assertNotContains(self.get(), 'Not committed yet')
+
+
+class CommentCountersTest(TestCase):
+    def setUp(self):
+        self.first = Article.objects.create(title='First article', text='Text')
+        self.second = Article.objects.create(title='Second article', text='Text')
+
+    def assertCounters(self, article, count, last_comment):
+        article.refresh_from_db()
+        self.assertEqual(article.comment_count, count)
+        self.assertEqual(article.last_commented_at, last_comment.created_at if last_comment else None)
+
+    def test_create_and_edit(self):
+        older = self.first.comments.create(text='Older')
+        newer = self.first.comments.create(text='Newer')
+        self.assertCounters(self.first, 2, newer)
+        older.text = 'Older, edited'
+        older.save()
+        self.assertCounters(self.first, 2, newer)
+
+    def test_move(self):
+        comment = self.first.comments.create(text='Moving')
+        staying = self.second.comments.create(text='Staying')
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.article = self.second
+        comment.save()
+        self.assertCounters(self.first, 0, None)
+        self.assertCounters(self.second, 2, max(comment, staying, key=lambda c: c.created_at))
+
+    def test_delete(self):
+        older = self.first.comments.create(text='Older')
+        newer = self.first.comments.create(text='Newer')
+        newer.delete()
+        self.assertCounters(self.first, 1, older)
+        older.delete()
+        self.assertCounters(self.first, 0, None)
+
+    def test_stale_article_save_keeps_counters(self):
+        stale = Article.objects.get(pk=self.first.pk)
+        comment = self.first.comments.create(text='Comment')
+        stale.title = 'First article, edited'
+        stale.save()
+        self.assertCounters(self.first, 1, comment)
+        self.assertEqual(self.first.title, 'First article, edited')
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name='Category {}'.format(i)) for i in range(3)]
+        articles = []
+        for i in range(12):
+            article = Article.objects.create(title='Budget article {}'.format(i), text='Text',
+                                             category=categories[i % 3])
+            for j in range(4):
+                Comment.objects.create(article=article, text='Comment {}'.format(j))
+            articles.append(article)
+        Article.objects.filter(pk__in=[article.pk for article in articles[:3]]).update(status=STATUS_ARCHIVED)
+        cls.article = articles[4]
+        cls.user = User.objects.create_user('budget', password='budget')
+
+    def get_pages(self):
+        pk = self.article.pk
+        return [
+            reverse('webapp:index'),
+            reverse('webapp:archive'),
+            reverse('webapp:article_view', kwargs={'pk': pk}),
+            reverse('webapp:comment_list'),
+            reverse('webapp:search_results') + '?text=budget&in_title=on&in_text=on',
+            reverse('webapp:api_article_list'),
+            reverse('webapp:api_article_detail', kwargs={'pk': pk}),
+            reverse('webapp:api_article_comments', kwargs={'pk': pk}),
+        ]
+
+    def test_anonymous_pages_fit_budget(self):
+        for url in self.get_pages():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_authenticated_pages_fit_budget(self):
+        self.client.force_login(self.user)
+        for url in self.get_pages():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'webapp:comment_list': {'queries': 1, 'duplicates': 0}})
+    def test_violation_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('webapp:comment_list'))
+
+
+class ServerTimingTest(TestCase):
+    @override_settings(SERVER_TIMING=True)
+    def test_header_lists_phases(self):
+        response = self.client.get(reverse('webapp:index'))
+        metrics = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['view', 'render', 'sql', 'total'])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('webapp:index')))
+
+    def test_profile_requires_staff(self):
+        user = User.objects.create_user('staff', password='staff')
+        self.client.force_login(user)
+        response = self.client.get(reverse('webapp:index') + '?_profile')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('webapp:index') + '?_profile')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn(b'function calls', response.content)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = Article.objects.create(title='Query plan article', text='Text')
+        Comment.objects.create(article=cls.article, text='Comment')
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.explain(queryset)
+        self.assertIn('USING INDEX {}'.format(index_name), plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def get_pages(self, queryset, ordering=('-created_at', '-pk')):
+        paginator = CursorPaginator(queryset, 5, ordering)
+        position = [self.article.created_at, self.article.pk]
+        return [
+            paginator.object_list[:6],
+            paginator.object_list.filter(paginator.get_position_query(position))[:6],
+        ]
+
+    def test_index_page(self):
+        for queryset in self.get_pages(Article.objects.filter(status=STATUS_ACTIVE)):
+            self.assertUsesIndex(queryset, 'article_active_created_idx')
+
+    def test_archive_page(self):
+        for queryset in self.get_pages(Article.objects.filter(status=STATUS_ARCHIVED)):
+            self.assertUsesIndex(queryset, 'article_archived_created_idx')
+
+    def test_activity_page(self):
+        queryset = Article.objects.filter(status=STATUS_ACTIVE, last_commented_at__isnull=False) \
+            .order_by('-last_commented_at', '-pk')[:6]
+        self.assertUsesIndex(queryset, 'article_active_activity_idx')
+
+    def test_article_comment_page(self):
+        for queryset in self.get_pages(self.article.comments.all()):
+            self.assertUsesIndex(queryset, 'comment_article_created_idx')
+
+    def test_comment_list_page(self):
+        for queryset in self.get_pages(Comment.objects.all()):
+            self.assertUsesIndex(queryset, 'comment_created_idx')
+
+    def test_tag_page(self):
+        tag = Tag.objects.create(name='Plan')
+        self.article.tags.add(tag)
+        through = Article.tags.through.objects.filter(tag=tag, article__status=STATUS_ACTIVE)
+        paginator = CursorPaginator(through, 5, ('-pk',))
+        for queryset in [paginator.object_list[:6],
+                         paginator.object_list.filter(paginator.get_position_query([10]))[:6]]:
+            plan = self.explain(queryset)
+            self.assertRegex(plan, r'SEARCH webapp_article_tags USING (COVERING )?INDEX \w*tag_id')
+            self.assertIn('SEARCH webapp_article USING INTEGER PRIMARY KEY', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ImportExportTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Export')
+        tags = [Tag.objects.create(name='export'), Tag.objects.create(name='jsonl')]
+        for i in range(3):
+            article = Article.objects.create(title='Export article {}'.format(i), text='Text {}'.format(i),
+                                             category=category, status=STATUS_ARCHIVED if i == 2 else STATUS_ACTIVE)
+            article.tags.set(tags[:i])
+            for j in range(i):
+                Comment.objects.create(article=article, text='Comment {}'.format(j))
+        self.path = os.path.join(tempfile.mkdtemp(), 'articles.jsonl')
+        self.addCleanup(os.remove, self.path)
+
+    def test_round_trip(self):
+        call_command('export_articles', output=self.path, batch_size=2, stdout=StringIO())
+        with open(self.path, encoding='utf-8') as export_file:
+            lines = [json.loads(line) for line in export_file]
+        self.assertEqual([len(line['comments']) for line in lines], [0, 1, 2])
+        self.assertEqual(lines[2]['tags'], ['export', 'jsonl'])
+
+        call_command('import_articles', self.path, batch_size=2, stdout=StringIO())
+        imported = Article.objects.filter(pk__gt=3).order_by('pk')
+        self.assertEqual([article.comment_count for article in imported], [0, 1, 2])
+        self.assertEqual([article.created_at for article in imported],
+                         list(Article.objects.filter(pk__lte=3).order_by('pk').values_list('created_at', flat=True)))
+        self.assertEqual(list(imported[2].tags.values_list('name', flat=True)), ['export', 'jsonl'])
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Counter.get_value(ARCHIVED_ARTICLES_COUNTER), 2)
+
+
+class SearchExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            Article.objects.create(title='Exported article {}'.format(i), text='Streaming text')
+        Article.objects.create(title='Something else', text='Other')
+
+    def get_export(self, export_format):
+        url = reverse('webapp:search_export') + '?text=exported&in_title=on&format=' + export_format
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        lines = self.get_export('csv').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['pk', 'title', 'author'])
+        self.assertEqual(len(lines), 8)
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in self.get_export('jsonl').splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertTrue(all(row['title'].startswith('Exported') for row in rows))
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(reverse('webapp:search_export')).status_code, 400)
+        url = reverse('webapp:search_export') + '?text=exported&in_title=on&format=xml'
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Api')
+        articles = [Article.objects.create(title='Api article {}'.format(i), text='Text', category=category)
+                    for i in range(25)]
+        cls.article = articles[0]
+        Comment.objects.create(article=cls.article, text='First')
+
+    def test_list_pages(self):
+        response = self.client.get(reverse('webapp:api_article_list'))
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['category'], 'Api')
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+
+    def test_detail_not_modified(self):
+        url = reverse('webapp:api_article_detail', kwargs={'pk': self.article.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['comment_count'], 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified(self):
+        # удаление последнего комментария сдвинуло бы время правки назад
+        for url in (reverse('webapp:api_article_list'),
+                    reverse('webapp:api_article_detail', kwargs={'pk': self.article.pk}),
+                    reverse('webapp:api_article_comments', kwargs={'pk': self.article.pk})):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+                self.assertEqual(response.status_code, 200)
+
+    def test_comments_change_etag(self):
+        url = reverse('webapp:api_article_comments', kwargs={'pk': self.article.pk})
+        response = self.client.get(url)
+        self.assertEqual([comment['text'] for comment in response.json()['results']], ['First'])
+        etag = response['ETag']
+        Comment.objects.create(article=self.article, text='Second')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        Comment.objects.filter(text='Second').delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_missing_article(self):
+        missing = Article.objects.order_by('-pk').values_list('pk', flat=True).first() + 1
+        url = reverse('webapp:api_article_detail', kwargs={'pk': missing})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = Article.objects.create(title='Conditional article', text='Text')
+        cls.user = User.objects.create_user('conditional', password='conditional')
+
+    def test_index_not_modified_until_write(self):
+        url = reverse('webapp:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with run_commit_callbacks():
+            Comment.objects.create(article=self.article, text='New comment')
+            # до COMMIT версия прежняя: незакоммиченное не попадает в кэш под новой
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_article_not_modified(self):
+        url = reverse('webapp:article_view', kwargs={'pk': self.article.pk})
+        response = self.client.get(url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.article.title = 'Conditional article, edited'
+        with run_commit_callbacks():
+            self.article.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_logged_in_responses_are_private(self):
+        url = reverse('webapp:article_view', kwargs={'pk': self.article.pk})
+        anonymous_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonymous_etag).status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def get_read_alias(self, method, path, cookies=None):
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.user = AnonymousUser()
+        request.resolver_match = resolve(path)
+        aliases = {}
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            aliases['article'] = router.db_for_read(Article)
+            aliases['session'] = router.db_for_read(Session)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        return aliases, response
+
+    def test_listed_views_read_from_replica(self):
+        aliases, _ = self.get_read_alias('get', reverse('webapp:index'))
+        self.assertEqual(aliases, {'article': 'replica', 'session': 'default'})
+        aliases, _ = self.get_read_alias('get', reverse('webapp:article_add'))
+        self.assertEqual(aliases['article'], 'default')
+        self.assertEqual(router.db_for_read(Article), 'default')
+        self.assertEqual(router.db_for_write(Article), 'default')
+
+    def test_write_pins_client_to_primary(self):
+        aliases, response = self.get_read_alias('post', reverse('webapp:article_add'))
+        self.assertEqual(aliases['article'], 'default')
+        cookie = response.cookies['primary_pin']
+        aliases, _ = self.get_read_alias('get', reverse('webapp:index'), {'primary_pin': cookie.value})
+        self.assertEqual(aliases['article'], 'default')
+
+
+class ConcurrentWritesTest(SimpleTestCase):
+    @override_settings(WRITE_RETRY_DELAY=0)
+    def test_retry_on_lock(self):
+        calls = []
+
+        @retry_on_lock
+        def write(error):
+            calls.append(error)
+            if len(calls) < 3:
+                raise OperationalError(error)
+            return 'written'
+
+        self.assertEqual(write('database is locked'), 'written')
+        self.assertEqual(len(calls), 3)
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write('no such table: webapp_article')
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(WRITE_RETRY_ATTEMPTS=2, WRITE_RETRY_DELAY=0)
+    def test_retries_are_bounded(self):
+        @retry_on_lock
+        def write():
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            write()
+
+
+class WriteRetryTest(TransactionTestCase):
+    """
+    Блокировка после INSERT (на COMMIT или в обработчике сигнала):
+    повтор должен начинаться с чистого состояния, а не с экземпляра
+    откатившейся попытки.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('retry', password='secret-password')
+        self.client.login(username='retry', password='secret-password')
+
+    def fail_once(self, signal, sender):
+        failures = []
+
+        def handler(instance, **kwargs):
+            if not failures:
+                failures.append(instance.pk)
+                raise OperationalError('database is locked')
+
+        signal.connect(handler, sender=sender, weak=False)
+        self.addCleanup(signal.disconnect, handler, sender=sender)
+        return failures
+
+    @override_settings(WRITE_RETRY_DELAY=0)
+    def test_create_is_retried_as_insert(self):
+        failures = self.fail_once(post_save, Article)
+        response = self.client.post(reverse('webapp:article_add'),
+                                    {'title': 'Retried long title', 'text': 'Text', 'author': 'Author'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(Article.objects.filter(title='Retried long title').count(), 1)
+
+    @override_settings(WRITE_RETRY_DELAY=0)
+    def test_delete_is_retried_with_fresh_object(self):
+        article = Article.objects.create(title='Article with comment', text='Text')
+        comment = article.comments.create(text='Comment')
+        failures = []
+        commit = connection.commit
+
+        def fail_first_commit():
+            if not failures:
+                failures.append(True)
+                raise OperationalError('database is locked')
+            commit()
+
+        with mock.patch.object(connection, 'commit', fail_first_commit):
+            response = self.client.get(reverse('webapp:comment_delete', kwargs={'pk': comment.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(failures), 1)
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
+        article.refresh_from_db()
+        self.assertEqual(article.comment_count, 0)
+
+
+class SqlitePragmaTest(TransactionTestCase):
+    # synchronous нельзя менять внутри транзакции, в которую TestCase оборачивает тест
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite specific')
+    @override_settings(SQLITE_CONCURRENT_WRITES=True, SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_pragmas_applied(self):
+        configure_connection(connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+            # остальные значения - по умолчанию из webapp.db
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class TagTest(TestCase):
+    def setUp(self):
+        self.tag = Tag.objects.create(name='Python')
+        self.articles = [Article.objects.create(title='Tagged article {}'.format(i), text='Text')
+                         for i in range(7)]
+
+    def assertCount(self, count):
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.article_count, count)
+
+    def test_slug_is_normalized_and_unique(self):
+        self.assertEqual(self.tag.slug, 'python')
+        duplicate = Tag(name=' PYTHON ')
+        with self.assertRaises(ValidationError):
+            duplicate.full_clean()
+
+    def test_punctuation_keeps_tags_apart(self):
+        names = ['C', 'C++', 'C#', '.NET', 'net', 'CI/CD']
+        tags = [Tag.objects.create(name=name) for name in names]
+        self.assertEqual([tag.slug for tag in tags], ['c', 'c++', 'c#', '.net', 'net', 'ci/cd'])
+        for tag in tags:
+            tag.articles.add(self.articles[0])
+            url = reverse('webapp:tag_view', kwargs={'slug': tag.slug})
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).context['tag'], tag)
+
+    def test_article_count_follows_changes(self):
+        for article in self.articles:
+            article.tags.add(self.tag)
+        self.assertCount(7)
+        self.articles[0].tags.remove(self.tag, Tag.objects.create(name='Unrelated'))
+        self.assertCount(6)
+        self.tag.articles.remove(self.articles[1])
+        self.assertCount(5)
+        self.articles[2].tags.clear()
+        self.assertCount(4)
+        self.articles[3].delete()
+        self.assertCount(3)
+        self.tag.articles.add(*self.articles[:2])
+        self.assertCount(5)
+
+    def test_count_matches_listing_after_archiving(self):
+        self.tag.articles.add(*self.articles[:3])
+        url = reverse('webapp:tag_view', kwargs={'slug': self.tag.slug})
+
+        def assertAgree(count):
+            response = self.client.get(url)
+            self.assertEqual(len(response.context['articles']), count)
+            self.assertEqual(response.context['tag'].article_count, count)
+            self.assertContains(self.client.get(reverse('webapp:tag_cloud')), 'Python</a> ({})'.format(count))
+
+        assertAgree(3)
+        article = self.articles[0]
+        article.status = STATUS_ARCHIVED
+        article.save()
+        assertAgree(2)
+        bulk.archive_articles([self.articles[1].pk])
+        assertAgree(1)
+        # архивная статья при добавлении тега не считается
+        self.tag.articles.add(self.articles[1])
+        self.articles[0].tags.add(self.tag)
+        assertAgree(1)
+        bulk.unarchive_articles([self.articles[0].pk, self.articles[1].pk])
+        assertAgree(3)
+
+    def test_tag_page_and_cloud(self):
+        self.tag.articles.add(*self.articles)
+        url = reverse('webapp:tag_view', kwargs={'slug': 'python'})
+        response = self.client.get(url)
+        self.assertEqual([article.pk for article in response.context['articles']],
+                         [article.pk for article in reversed(self.articles)][:5])
+        response = self.client.get(url + '?cursor=' + response.context['page_obj'].next_cursor)
+        self.assertEqual(len(response.context['articles']), 2)
+        self.assertEqual(self.client.get(reverse('webapp:tag_view', kwargs={'slug': 'nope'})).status_code, 404)
+
+        bulk.archive_articles([self.articles[-1].pk])
+        response = self.client.get(url)
+        self.assertNotIn(self.articles[-1], response.context['articles'])
+        self.assertEqual(len(response.context['articles']), 5)
+
+        self.client.get(reverse('webapp:tag_cloud'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('webapp:tag_cloud'))
+        self.assertContains(response, 'Python</a> (6)')
+        self.articles[0].tags.remove(self.tag)
+        self.assertContains(self.client.get(reverse('webapp:tag_cloud')), 'Python</a> (5)')
+
+    def test_search_fallback_matches_slug(self):
+        self.articles[0].tags.add(self.tag)
+        view = SearchResultsView()
+        form = FullSearchForm(data={'text': 'PYTHON ', 'in_tags': 'on'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(list(Article.objects.filter(view.get_text_query(form))), [self.articles[0]])
+        form = FullSearchForm(data={'text': 'python3', 'in_tags': 'on'})
+        self.assertTrue(form.is_valid())
+        self.assertFalse(Article.objects.filter(view.get_text_query(form)).exists())
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class TypeaheadTest(TestCase):
+    def setUp(self):
+        typeahead.reset()
+        self.addCleanup(typeahead.reset)
+        self.django = Article.objects.create(title='Django query tips', text='Text', author='Alice')
+        self.learning = Article.objects.create(title='Learning Django fast', text='Text', author='Alice')
+        Article.objects.create(title='Old django article', text='Text', author='Dan', status=STATUS_ARCHIVED)
+
+    def complete(self, query, **params):
+        response = self.client.get(reverse('webapp:typeahead'), dict(params, q=query))
+        return [(result['kind'], result['label']) for result in response.json()['results']]
+
+    def test_prefix_and_word_matches(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.complete('djan'), [('title', 'Django query tips'),
+                                                     ('title', 'Learning Django fast')])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('AL'), [('author', 'Alice')])
+            self.assertEqual(self.complete('djan', limit=1), [('title', 'Django query tips')])
+            self.assertEqual(self.complete(''), [])
+
+    def test_signals_keep_index_fresh(self):
+        self.complete('x')
+        article = Article.objects.create(title='Djangonaut notes', text='Text', author='Bob')
+        self.learning.status = STATUS_ARCHIVED
+        self.learning.save()
+        self.django.title = 'Flask query tips'
+        self.django.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('djan'), [('title', 'Djangonaut notes')])
+            self.assertEqual(self.complete('al'), [('author', 'Alice')])
+        self.django.delete()
+        article.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('al'), [])
+            self.assertEqual(self.complete('b'), [])
+
+    def test_built_once(self):
+        self.complete('x')
+        # update() идёт мимо сигналов, а полной пересборки внутри запроса нет
+        Article.objects.filter(pk=self.learning.pk).update(title='Renamed by update')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('renamed'), [])
+
+
+class ArticleFormViewTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('writer', password='secret-password')
+        self.client.force_login(user)
+
+    def test_create_and_update(self):
+        data = {'title': 'Form article title', 'text': 'Form text', 'author': 'Writer'}
+        response = self.client.post(reverse('webapp:article_add'), data)
+        article = Article.objects.get(title='Form article title')
+        self.assertRedirects(response, reverse('webapp:article_view', kwargs={'pk': article.pk}),
+                             fetch_redirect_response=False)
+        self.assertEqual((article.text, article.author), ('Form text', 'Writer'))
+
+        url = reverse('webapp:article_update', kwargs={'pk': article.pk})
+        response = self.client.post(url, dict(data, title='Changed form title', text='Changed text'))
+        self.assertEqual(response.status_code, 302)
+        article.refresh_from_db()
+        self.assertEqual((article.title, article.text), ('Changed form title', 'Changed text'))
+
+    def test_clean_rejects_text_equal_to_title(self):
+        data = {'title': 'Duplicated title', 'text': 'Duplicated title', 'author': 'Writer'}
+        response = self.client.post(reverse('webapp:article_add'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].errors.as_data()['__all__'][0].code, 'title_text_duplicate')
+        self.assertFalse(Article.objects.exists())
+
+
+class WriteViewQueriesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='secret-password')
+        self.client.login(username='writer', password='secret-password')
+        self.article = Article.objects.create(title='Article for writing', text='Text', author='Author')
+        self.comment = self.article.comments.create(text='Comment', author='Author')
+        # пользователь и сессия попадают в кэш до замеров
+        self.client.get(reverse('webapp:article_search'))
+
+    def assertRequestQueries(self, num, url, data=None, status=302):
+        with self.assertNumQueries(num):
+            response = self.client.get(url) if data is None else self.client.post(url, data)
+        self.assertEqual(response.status_code, status)
+
+    def test_article_views(self):
+        self.assertRequestQueries(2, reverse('webapp:article_add'), status=200)
+        self.assertRequestQueries(6, reverse('webapp:article_add'),
+                                  {'title': 'Another long title', 'text': 'Text', 'author': 'Author'})
+        url = reverse('webapp:article_update', kwargs={'pk': self.article.pk})
+        self.assertRequestQueries(4, url, status=200)
+        self.assertRequestQueries(8, url, {'title': 'Changed long title', 'text': 'Text', 'author': 'Author'})
+        url = reverse('webapp:article_delete', kwargs={'pk': self.article.pk})
+        self.assertRequestQueries(1, url, status=200)
+        self.assertRequestQueries(7, url, {})
+
+    def test_comment_views(self):
+        self.assertRequestQueries(1, reverse('webapp:comment_add'), status=200)
+        self.assertRequestQueries(8, reverse('webapp:comment_add'),
+                                  {'article': self.article.pk, 'text': 'Text', 'author': 'Author'})
+        url = reverse('webapp:article_comment_create', kwargs={'pk': self.article.pk})
+        self.assertRequestQueries(1, url, status=200)
+        self.assertRequestQueries(7, url, {'text': 'Text', 'author': 'Author'})
+        url = reverse('webapp:comment_update', kwargs={'pk': self.comment.pk})
+        self.assertRequestQueries(1, url, status=200)
+        self.assertRequestQueries(6, url, {'text': 'Changed', 'author': 'Author'})
+        self.assertRequestQueries(7, reverse('webapp:comment_delete', kwargs={'pk': self.comment.pk}))
+        self.assertEqual(self.article.comments.count(), 2)
+
+    def test_archived_article_and_anonymous_user(self):
+        Article.objects.filter(pk=self.article.pk).update(status=STATUS_ARCHIVED)
+        self.assertRequestQueries(1, reverse('webapp:comment_update', kwargs={'pk': self.comment.pk}), status=404)
+        self.assertRequestQueries(1, reverse('webapp:article_comment_create', kwargs={'pk': self.article.pk}),
+                                  status=404)
+        self.client.logout()
+        self.assertRequestQueries(0, reverse('webapp:comment_delete', kwargs={'pk': self.comment.pk}))
+        self.assertRequestQueries(0, reverse('webapp:article_comment_create', kwargs={'pk': self.article.pk}))
+        self.assertTrue(Comment.objects.filter(pk=self.comment.pk).exists())
+
+
+class BulkModerationTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('moderator', password='secret-password', is_staff=True,
+                                              is_superuser=True)
+        self.client.login(username='moderator', password='secret-password')
+        self.articles = [Article.objects.create(title='Bulk article {}'.format(i), text='Spam text', author='Spammer')
+                         for i in range(6)]
+        for article in self.articles[:3]:
+            for i in range(4):
+                article.comments.create(text='buy pills {}'.format(i), author='Spammer')
+
+    def post_ids(self, name, ids):
+        return self.client.post(reverse('webapp:' + name), json.dumps({'ids': ids}), content_type='application/json')
+
+    def test_archive_and_unarchive(self):
+        pks = [article.pk for article in self.articles[:4]]
+        self.client.get(reverse('webapp:index'))
+        response = self.post_ids('bulk_archive', pks + [pks[0], 999999])
+        self.assertEqual(response.json(), {'affected': 4})
+        self.assertEqual(Article.objects.filter(status=STATUS_ARCHIVED).count(), 4)
+        self.assertEqual(Counter.get_value(ARCHIVED_ARTICLES_COUNTER), 4)
+        self.assertEqual(len(self.client.get(reverse('webapp:index')).context['articles']), 2)
+        self.assertEqual(self.post_ids('bulk_archive', pks).json(), {'affected': 0})
+
+        response = self.client.post(reverse('webapp:bulk_unarchive'), {'ids': pks[:2]})
+        self.assertEqual(response.json(), {'affected': 2})
+        self.assertEqual(Counter.get_value(ARCHIVED_ARTICLES_COUNTER), 2)
+
+    def test_delete_comments(self):
+        article = self.articles[0]
+        self.client.get(reverse('webapp:article_view', kwargs={'pk': article.pk}))
+        pks = list(Comment.objects.filter(article__in=self.articles[:2]).values_list('pk', flat=True))
+        self.assertEqual(self.post_ids('bulk_comment_delete', pks).json(), {'affected': 8})
+        article.refresh_from_db()
+        self.assertEqual((article.comment_count, article.last_commented_at), (0, None))
+        self.assertEqual(Comment.objects.count(), 4)
+        response = self.client.get(reverse('webapp:article_view', kwargs={'pk': article.pk}))
+        self.assertNotContains(response, 'buy pills')
+        if search.is_available():
+            self.assertEqual(list(search.filter_queryset(Article.objects.all(), 'pills', ['comments'])),
+                             [self.articles[2]])
+
+    def test_admin_actions(self):
+        response = self.client.post(reverse('admin:webapp_article_changelist'), {
+            'action': 'archive_articles', '_selected_action': [self.articles[0].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Counter.get_value(ARCHIVED_ARTICLES_COUNTER), 1)
+        self.client.post(reverse('admin:webapp_comment_changelist'), {
+            'action': 'delete_comments',
+            '_selected_action': list(self.articles[1].comments.values_list('pk', flat=True)),
+        })
+        self.articles[1].refresh_from_db()
+        self.assertEqual(self.articles[1].comment_count, 0)
+
+    def test_rejects_non_staff_and_bad_input(self):
+        self.assertEqual(self.post_ids('bulk_archive', ['x']).status_code, 400)
+        self.assertEqual(self.post_ids('bulk_archive', []).status_code, 400)
+        for bad in (True, 1.9, str(self.articles[0].pk), None, [self.articles[0].pk]):
+            self.assertEqual(self.post_ids('bulk_archive', [bad]).status_code, 400, bad)
+        for bad in ('1.9', ' 7', '-1', '٧'):
+            response = self.client.post(reverse('webapp:bulk_archive'), {'ids': [bad]})
+            self.assertEqual(response.status_code, 400, bad)
+        with self.assertRaises(TypeError):
+            list(bulk.batches([True]))
+        self.assertEqual(self.client.get(reverse('webapp:bulk_archive')).status_code, 405)
+        User.objects.create_user('reader', password='secret-password')
+        self.client.login(username='reader', password='secret-password')
+        self.assertEqual(self.post_ids('bulk_archive', [self.articles[0].pk]).status_code, 403)
+        self.assertFalse(Article.objects.filter(status=STATUS_ARCHIVED).exists())
+
+    def test_requires_matching_permission(self):
+        staff = User.objects.create_user('staff', password='secret-password', is_staff=True)
+        self.client.login(username='staff', password='secret-password')
+        comment_pks = list(Comment.objects.values_list('pk', flat=True)[:2])
+        self.assertEqual(self.post_ids('bulk_archive', [self.articles[0].pk]).status_code, 403)
+        self.assertEqual(self.post_ids('bulk_comment_delete', comment_pks).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='change_article'))
+        self.assertEqual(self.post_ids('bulk_archive', [self.articles[0].pk]).json(), {'affected': 1})
+        self.assertEqual(self.post_ids('bulk_comment_delete', comment_pks).status_code, 403)
+        staff.user_permissions.add(Permission.objects.get(codename='delete_comment'))
+        self.assertEqual(self.post_ids('bulk_comment_delete', comment_pks).json(), {'affected': 2})
+
+
+class AdminScalingTest(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret-password')
+        self.client.login(username='admin', password='secret-password')
+        self.category = Category.objects.create(name='Science')
+        self.articles = [Article.objects.create(title='Admin article {}'.format(i), text='Text {}'.format(i),
+                                                author='Author {}'.format(i % 3), category=self.category)
+                         for i in range(12)]
+        self.articles[5].title = 'Quantum entanglement notes'
+        self.articles[5].save()
+        Comment.objects.bulk_create([Comment(article=self.articles[0], text='Comment {}'.format(i))
+                                     for i in range(25)])
+
+    def get_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_changelist_caches_counts_and_filter_choices(self):
+        url = reverse('admin:webapp_article_changelist')
+        response, queries = self.get_queries(url)
+        # список авторов для фильтра и COUNT страницы - по одному разу
+        self.assertEqual(len([sql for sql in queries if 'COUNT(' in sql]), 2)
+        self.assertIsNone(response.context['cl'].full_result_count)
+        response, queries = self.get_queries(url)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(response.context['cl'].result_count, 12)
+
+        response, _ = self.get_queries(url + '?author=Author+1')
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+    @skipUnless(connection.vendor == 'sqlite', 'full text index is SQLite specific')
+    def test_search_uses_full_text_index(self):
+        response, queries = self.get_queries(reverse('admin:webapp_article_changelist') + '?q=quantum')
+        self.assertEqual(list(response.context['cl'].result_list), [self.articles[5]])
+        self.assertTrue(any('MATCH' in sql for sql in queries))
+
+    def test_change_form_limits_comment_inline(self):
+        response, queries = self.get_queries(reverse('admin:webapp_article_change', args=[self.articles[0].pk]))
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 20)
+        self.assertContains(response, '?article__id__exact={}'.format(self.articles[0].pk))
+        # категории и теги - виджеты автодополнения, а не полный список в select
+        self.assertFalse([sql for sql in queries if 'FROM "webapp_tag"' in sql and 'WHERE' not in sql])
+        self.assertFalse([sql for sql in queries if 'FROM "webapp_category"' in sql and 'WHERE' not in sql])
+
+    def test_inline_edits_survive_new_comments(self):
+        article = self.articles[0]
+        url = reverse('admin:webapp_article_change', args=[article.pk])
+        formset = self.client.get(url).context['inline_admin_formsets'][0].formset
+        shown = [form.instance for form in formset.forms]
+        data = {
+            'title': article.title, 'text': article.text, 'author': article.author,
+            'category': self.category.pk, 'status': STATUS_ACTIVE,
+            'comments-TOTAL_FORMS': len(shown), 'comments-INITIAL_FORMS': len(shown),
+            'comments-MIN_NUM_FORMS': 0, 'comments-MAX_NUM_FORMS': 1000,
+        }
+        for index, comment in enumerate(shown):
+            data.update({
+                'comments-{}-id'.format(index): comment.pk,
+                'comments-{}-article'.format(index): article.pk,
+                'comments-{}-author'.format(index): comment.author,
+                'comments-{}-text'.format(index): comment.text,
+            })
+        data['comments-{}-text'.format(len(shown) - 1)] = 'Edited oldest shown'
+        # окно "последних" сдвигается между открытием формы и сохранением
+        article.comments.create(text='Newer comment')
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(Comment.objects.get(pk=shown[-1].pk).text, 'Edited oldest shown')
+        self.assertEqual(article.comments.count(), 26)
+
+    def test_category_autocomplete(self):
+        response = self.client.get(reverse('admin:webapp_category_autocomplete'), {'term': 'sci'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Science'])
+
+
+class UrlTemplateTest(SimpleTestCase):
+    def test_fill_matches_reverse(self):
+        template = Template("{% load fast_urls %}{% url_template 'webapp:comment_update' as url %}"
+                            "{% for pk in pks %}{{ url|fill:pk }} {% endfor %}")
+        pks = [1, 42, 918273]
+        self.assertEqual(template.render(Context({'pks': pks})).split(),
+                         [reverse('webapp:comment_update', kwargs={'pk': pk}) for pk in pks])
+
+    def test_rejects_url_without_pk(self):
+        with self.assertRaises(NoReverseMatch):
+            Template("{% load fast_urls %}{% url_template 'webapp:index' %}").render(Context())
+
+    def test_bench_templates(self):
+        out = StringIO()
+        call_command('bench_templates', rows=3, repeat=1, stdout=out)
+        self.assertIn('comment/list.html', out.getvalue())
+        self.assertIn('3 links x 3 rows', out.getvalue())
+
+
+class BenchCommandTest(TransactionTestCase):
+    """
+    bench сам создаёт и удаляет временную базу; внутри тестов она уже есть,
+    поэтому прогон идёт прямо в тестовой базе.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for patcher in (mock.patch('webapp.management.commands.bench.setup_test_environment'),
+                        mock.patch('webapp.management.commands.bench.teardown_test_environment'),
+                        mock.patch.object(connection.creation, 'create_test_db'),
+                        mock.patch.object(connection.creation, 'destroy_test_db')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_bench(self, **options):
+        output = os.path.join(self.root, 'bench.json')
+        call_command('bench', articles=20, comments=30, tags=5, categories=2, requests=2,
+                     output=output, stdout=StringIO(), **options)
+        with open(output) as report_file:
+            return json.load(report_file)
+
+    def test_report(self):
+        report = self.run_bench()
+        self.assertEqual(report['volume'], {'articles': 20, 'comments': 30, 'tags': 5, 'categories': 2})
+        self.assertIn('article_create', report['scenarios'])
+        for result in report['scenarios'].values():
+            self.assertEqual(result['requests'], 2)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries_max'], 0)
+
+    def test_baseline_regression(self):
+        baseline = os.path.join(self.root, 'baseline.json')
+        with open(baseline, 'w') as baseline_file:
+            json.dump({'scenarios': {'index': {'p95_ms': 0.001, 'queries_max': 0}}}, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'index: queries 0 ->'):
+            self.run_bench(baseline=baseline, threshold=20)
+
+
+class StaticAssetsTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        with override_settings(STATIC_ROOT=self.root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as manifest:
+            self.hashed = json.load(manifest)['paths']['css/style.css']
+        self.app = StaticFilesApplication(self.wrapped, root=self.root, prefix='/static/')
+
+    @staticmethod
+    def wrapped(environ, start_response):
+        start_response('200 OK', [])
+        return [b'django']
+
+    def call(self, path, method='GET', **headers):
+        environ = dict(headers, PATH_INFO=path, REQUEST_METHOD=method)
+        result = {}
+
+        def start_response(status, response_headers):
+            result['status'] = status
+            result['headers'] = dict(response_headers)
+
+        body = b''.join(self.app(environ, start_response))
+        return result['status'], result['headers'], body
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertNotEqual(self.hashed, 'css/style.css')
+        with open(os.path.join(self.root, self.hashed), 'rb') as original, \
+                gzip.open(os.path.join(self.root, self.hashed + '.gz')) as compressed:
+            self.assertEqual(original.read(), compressed.read())
+
+    def test_serves_hashed_file_with_far_future_caching(self):
+        status, headers, body = self.call('/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        self.assertIn(b'body', gzip.decompress(body))
+
+        status, plain_headers, body = self.call('/static/' + self.hashed)
+        self.assertNotIn('Content-Encoding', plain_headers)
+        self.assertIn(b'body', body)
+        self.assertNotEqual(plain_headers['ETag'], headers['ETag'])
+
+        status, _, body = self.call('/static/' + self.hashed, HTTP_IF_NONE_MATCH=plain_headers['ETag'])
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+        status, _, body = self.call('/static/' + self.hashed, method='HEAD')
+        self.assertEqual((status, body), ('200 OK', b''))
+
+    def test_gzip_follows_accept_encoding_quality(self):
+        cases = {
+            'gzip': True, 'GZIP;q=0.5': True, 'deflate, *': True, 'br;q=1.0, gzip;q=0.001': True,
+            'gzip;q=0': False, 'gzip; q=0.0, deflate': False, '*, gzip;q=0': False,
+            '*;q=0': False, 'deflate': False, 'gzip;q=oops': False, '': False,
+        }
+        for header, compressed in cases.items():
+            with self.subTest(header=header):
+                _, headers, _ = self.call('/static/' + self.hashed, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(headers.get('Content-Encoding') == 'gzip', compressed)
+
+    def test_unhashed_missing_and_other_paths(self):
+        status, headers, _ = self.call('/static/css/style.css')
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.call('/static/../manage.py')[0], '404 Not Found')
+        self.assertEqual(self.call('/static/css/style.css', method='POST')[0], '405 Method Not Allowed')
+        self.assertEqual(self.call('/article/1/')[2], b'django')
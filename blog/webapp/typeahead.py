@@ -0,0 +1,168 @@
+import bisect
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from webapp.models import Article, STATUS_ACTIVE
+
+
+KIND_TITLE = 'title'
+KIND_AUTHOR = 'author'
+
+# сколько записей индекса просматривается в поисках limit разных подсказок
+SCAN_FACTOR = 8
+
+
+def normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+def get_keys(text):
+    """
+    Ключи индекса: строка целиком и каждый её хвост с начала слова,
+    чтобы "djan" находило и "Django tips", и "Learning Django".
+    """
+    text = normalize(text)
+    return {text[match.start():] for match in re.finditer(r'\w+', text)} or {text}
+
+
+class PrefixIndex:
+    """
+    Отсортированный список (ключ, вид, подпись, pk) в памяти процесса;
+    поиск по префиксу - bisect, правка одной статьи - удаление и вставка
+    её записей. Авторы хранятся со счётчиком статей: запись автора
+    пропадает вместе с его последней активной статьёй.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.articles = {}
+        self.authors = Counter()
+        self.built = False
+
+    def rebuild(self):
+        rows = Article.objects.filter(status=STATUS_ACTIVE).values_list('pk', 'title', 'author')
+        entries, articles, authors = [], {}, Counter()
+        for pk, title, author in rows.iterator():
+            articles[pk] = (title, author)
+            entries.extend(self.title_entries(pk, title))
+            authors[author] += 1
+        for author in authors:
+            entries.extend(self.author_entries(author))
+        entries.sort()
+        with self.lock:
+            self.entries, self.articles, self.authors = entries, articles, authors
+            self.built = True
+
+    def clear(self):
+        with self.lock:
+            self.entries, self.articles, self.authors = [], {}, Counter()
+            self.built = False
+
+    @staticmethod
+    def title_entries(pk, title):
+        return [(key, KIND_TITLE, title, pk) for key in get_keys(title)]
+
+    @staticmethod
+    def author_entries(author):
+        return [(key, KIND_AUTHOR, author, None) for key in get_keys(author)]
+
+    def update(self, pk, title, author, active=True):
+        with self.lock:
+            if not self.built:
+                return
+            old = self.articles.pop(pk, None)
+            if old is not None:
+                self.remove_entries(self.title_entries(pk, old[0]))
+                self.release_author(old[1])
+            if active:
+                self.articles[pk] = (title, author)
+                self.insert_entries(self.title_entries(pk, title))
+                self.authors[author] += 1
+                if self.authors[author] == 1:
+                    self.insert_entries(self.author_entries(author))
+
+    def remove(self, pk):
+        self.update(pk, None, None, active=False)
+
+    def release_author(self, author):
+        self.authors[author] -= 1
+        if self.authors[author] <= 0:
+            del self.authors[author]
+            self.remove_entries(self.author_entries(author))
+
+    def insert_entries(self, entries):
+        for entry in entries:
+            bisect.insort(self.entries, entry)
+
+    def remove_entries(self, entries):
+        for entry in entries:
+            position = bisect.bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+
+    def complete(self, prefix, limit):
+        """
+        До limit подсказок, ключ которых начинается с prefix: сначала
+        совпадения с начала строки, затем с начала слова.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            entries = self.entries
+            start = bisect.bisect_left(entries, (prefix,))
+            found = []
+            for entry in entries[start:start + limit * SCAN_FACTOR]:
+                if not entry[0].startswith(prefix):
+                    break
+                found.append(entry)
+        results, seen = [], set()
+        for key, kind, label, pk in sorted(found, key=lambda e: (normalize(e[2]) != e[0], e[0])):
+            if (kind, label) in seen:
+                continue
+            seen.add((kind, label))
+            results.append({'kind': kind, 'label': label, 'pk': pk})
+            if len(results) == limit:
+                break
+        return results
+
+
+_index = PrefixIndex()
+
+
+def get_index():
+    """
+    Индекс текущего процесса: строится один раз, при первом обращении,
+    дальше его держат в актуальном состоянии сигналы и массовые операции
+    (webapp.bulk, import_articles). Правки мимо них - update() из shell,
+    запись из другого процесса - видны после перезапуска процесса.
+    """
+    if not _index.built:
+        _index.rebuild()
+    return _index
+
+
+def complete(prefix, limit=None):
+    limit = min(limit or settings.TYPEAHEAD_LIMIT, settings.TYPEAHEAD_MAX_LIMIT)
+    return get_index().complete(prefix, limit)
+
+
+def update_article(article):
+    _index.update(article.pk, article.title, article.author, active=article.status == STATUS_ACTIVE)
+
+
+def update_articles(rows, active):
+    for pk, title, author in rows:
+        _index.update(pk, title, author, active=active)
+
+
+def remove_article(pk):
+    _index.remove(pk)
+
+
+def reset():
+    _index.clear()
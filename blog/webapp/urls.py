@@ -2,7 +2,9 @@ from django.urls import path
 from webapp.views import IndexView, ArticleView, ArticleCreateView, \
     ArticleUpdateView, ArticleDeleteView, CommentCreateView, CommentForArticleCreateView, \
     CommentListView, CommentUpdateView, CommentDeleteView, ArticleSearchView, \
-    SearchResultsView
+    SearchResultsView, SearchExportView, ArchiveView, ArticleListApiView, ArticleApiView, \
+    ArticleCommentsApiView, TypeaheadView, TagView, TagCloudView, ArticleArchiveView, \
+    ArticleUnarchiveView, CommentBulkDeleteView
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
@@ -12,11 +14,24 @@ urlpatterns = [
     path('article/<int:pk>/delete/', ArticleDeleteView.as_view(), name='article_delete'),
     path('article/search/', ArticleSearchView.as_view(), name='article_search'),
     path('article/search/results/', SearchResultsView.as_view(), name='search_results'),
+    path('article/search/export/', SearchExportView.as_view(), name='search_export'),
+    path('archive/', ArchiveView.as_view(), name='archive'),
+    path('archive/<int:year>/', ArchiveView.as_view(), name='archive_year'),
+    path('archive/<int:year>/<int:month>/', ArchiveView.as_view(), name='archive_month'),
+    path('tags/', TagCloudView.as_view(), name='tag_cloud'),
+    path('tag/<path:slug>/', TagView.as_view(), name='tag_view'),
     path('comments/', CommentListView.as_view(), name='comment_list'),
     path('comment/add/', CommentCreateView.as_view(), name='comment_add'),
     path('comment/<int:pk>/edit/', CommentUpdateView.as_view(), name='comment_update'),
     path('comment/<int:pk>/delete/', CommentDeleteView.as_view(), name='comment_delete'),
-    path('article/<int:pk>/add-comment/', CommentForArticleCreateView.as_view(), name='article_comment_create')
+    path('article/<int:pk>/add-comment/', CommentForArticleCreateView.as_view(), name='article_comment_create'),
+    path('api/articles/', ArticleListApiView.as_view(), name='api_article_list'),
+    path('api/articles/<int:pk>/', ArticleApiView.as_view(), name='api_article_detail'),
+    path('api/articles/<int:pk>/comments/', ArticleCommentsApiView.as_view(), name='api_article_comments'),
+    path('api/typeahead/', TypeaheadView.as_view(), name='typeahead'),
+    path('moderation/articles/archive/', ArticleArchiveView.as_view(), name='bulk_archive'),
+    path('moderation/articles/unarchive/', ArticleUnarchiveView.as_view(), name='bulk_unarchive'),
+    path('moderation/comments/delete/', CommentBulkDeleteView.as_view(), name='bulk_comment_delete'),
 ]
 
 app_name = 'webapp'
\ No newline at end of file
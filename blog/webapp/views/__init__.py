@@ -1,5 +1,8 @@
 from .article_views import IndexView, ArticleView, \
     ArticleCreateView, ArticleUpdateView, ArticleDeleteView, \
-    ArticleSearchView, SearchResultsView
+    ArticleSearchView, SearchResultsView, SearchExportView, ArchiveView
 from .comment_views import CommentListView, CommentCreateView, \
-    CommentForArticleCreateView, CommentUpdateView, CommentDeleteView
\ No newline at end of file
+    CommentForArticleCreateView, CommentUpdateView, CommentDeleteView
+from .tag_views import TagView, TagCloudView
+from .api_views import ArticleListApiView, ArticleApiView, ArticleCommentsApiView, TypeaheadView
+from .moderation_views import ArticleArchiveView, ArticleUnarchiveView, CommentBulkDeleteView
@@ -0,0 +1,163 @@
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views import View
+
+from webapp import caching, typeahead
+from webapp.models import Article, Comment, STATUS_ACTIVE
+from webapp.pagination import CursorPaginator, InvalidCursor
+from .base_views import ConditionalGetMixin
+
+
+ARTICLE_LIST_FIELDS = ('pk', 'title', 'author', 'status', 'category__name', 'created_at', 'updated_at',
+                       'comment_count', 'last_commented_at')
+ARTICLE_FIELDS = ARTICLE_LIST_FIELDS + ('text',)
+COMMENT_FIELDS = ('pk', 'author', 'text', 'created_at', 'updated_at')
+
+
+def rename_category(data):
+    data['category'] = data.pop('category__name')
+    return data
+
+
+class ApiView(ConditionalGetMixin, View):
+    """
+    Базовый класс JSON API: только чтение, компактный JSON из get_data()
+    наследника и условный GET по ETag из get_validators(). Last-Modified не отдаётся:
+    время, посчитанное по строкам, идёт назад, когда последний комментарий
+    удалён или статья ушла со страницы, и If-Modified-Since дал бы ложный 304.
+    """
+    http_method_names = ['get', 'head', 'options']
+    json_dumps_params = {'separators': (',', ':'), 'ensure_ascii': False}
+    cursor_kwarg = 'cursor'
+    paginate_by = 20
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(self.get_data(), json_dumps_params=self.json_dumps_params)
+
+    def get_cursor(self):
+        return self.request.GET.get(self.cursor_kwarg)
+
+    def paginate(self, queryset, ordering=('-created_at', '-pk')):
+        """
+        Страница по курсору; результат запоминается, чтобы валидаторы
+        и тело ответа строились по одной выборке.
+        """
+        if not hasattr(self, '_page'):
+            paginator = CursorPaginator(queryset, self.paginate_by, ordering)
+            try:
+                self._page = paginator.page(self.get_cursor())
+            except InvalidCursor:
+                raise Http404('Invalid page cursor')
+        return self._page
+
+    def get_next_url(self, page):
+        if not page.has_next():
+            return None
+        url = self.request.build_absolute_uri(self.request.path)
+        return url + '?' + urlencode({self.cursor_kwarg: page.next_cursor})
+
+
+class ArticleListApiView(ApiView):
+    """
+    Лента активных статей. Валидаторы считаются по самой странице
+    (одна выборка по индексу), поэтому 304 обходится одним запросом.
+    """
+
+    def get_page(self):
+        queryset = Article.objects.filter(status=STATUS_ACTIVE).values(*ARTICLE_LIST_FIELDS)
+        return self.paginate(queryset)
+
+    def get_validators(self):
+        page = self.get_page()
+        parts = [self.get_cursor(), caching.get_categories_version(), page.has_next()]
+        for row in page:
+            parts.extend([row['pk'], row['updated_at'], row['comment_count'], row['last_commented_at']])
+        return parts, None
+
+    def get_data(self):
+        page = self.get_page()
+        return {
+            'results': [rename_category(dict(row)) for row in page],
+            'next': self.get_next_url(page),
+        }
+
+
+class ArticleStateMixin:
+    """
+    Статья вместе с временем последней правки её комментариев - одним запросом
+    по первичному ключу и индексу комментариев (article, updated_at).
+    """
+    article_fields = ARTICLE_LIST_FIELDS
+
+    def get_article(self):
+        if not hasattr(self, '_article'):
+            newest_comment = Comment.objects.filter(article=OuterRef('pk')) \
+                .order_by('-updated_at').values('updated_at')[:1]
+            queryset = Article.objects.filter(pk=self.kwargs['pk']) \
+                .annotate(comments_updated_at=Subquery(newest_comment)) \
+                .values(*self.article_fields, 'comments_updated_at')
+            article = queryset.first()
+            if article is None:
+                raise Http404('Article not found')
+            self._article = article
+        return self._article
+
+    def get_article_validators(self, *extra):
+        article = self.get_article()
+        parts = [article['pk'], article['updated_at'], article['comment_count'],
+                 article['comments_updated_at']] + list(extra)
+        return parts, None
+
+
+class ArticleApiView(ArticleStateMixin, ApiView):
+    article_fields = ARTICLE_FIELDS
+
+    def get_validators(self):
+        return self.get_article_validators(caching.get_categories_version())
+
+    def get_data(self):
+        article = dict(self.get_article())
+        del article['comments_updated_at']
+        article['comments'] = self.request.build_absolute_uri(
+            reverse('webapp:api_article_comments', kwargs={'pk': article['pk']}))
+        return rename_category(article)
+
+
+class ArticleCommentsApiView(ArticleStateMixin, ApiView):
+    article_fields = ('pk', 'updated_at', 'comment_count')
+
+    def get_validators(self):
+        return self.get_article_validators(self.get_cursor())
+
+    def get_data(self):
+        comments = Comment.objects.filter(article_id=self.get_article()['pk']).values(*COMMENT_FIELDS)
+        page = self.paginate(comments)
+        return {
+            'results': list(page),
+            'next': self.get_next_url(page),
+        }
+
+
+class TypeaheadView(View):
+    """
+    Подсказки для поля быстрого поиска из индекса в памяти процесса
+    (webapp.typeahead) - без запросов к базе.
+    """
+    http_method_names = ['get', 'head', 'options']
+    json_dumps_params = ApiView.json_dumps_params
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '')[:100]
+        try:
+            limit = int(request.GET.get('limit', 0))
+        except ValueError:
+            limit = 0
+        results = typeahead.complete(query, max(limit, 0))
+        for result in results:
+            if result['kind'] == typeahead.KIND_TITLE:
+                result['url'] = reverse('webapp:article_view', kwargs={'pk': result['pk']})
+            else:
+                result['url'] = reverse('webapp:index') + '?' + urlencode({'search': result['label']})
+        return JsonResponse({'query': query, 'results': results}, json_dumps_params=self.json_dumps_params)
@@ -1,39 +1,109 @@
+import csv
+import json
+from datetime import datetime
+
+from django.db import router, transaction
 from django.db.models import Q
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView, DetailView, CreateView, \
     UpdateView, DeleteView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.timezone import make_aware
 
+from webapp import bulk, caching, search
+from webapp.db import retry_on_lock
 from webapp.forms import ArticleForm, ArticleCommentForm, FullSearchForm
-from webapp.models import Article, STATUS_ARCHIVED, STATUS_ACTIVE
-from .base_views import SimpleSearchView
+from webapp.models import Article, Counter, make_tag_slug, STATUS_ARCHIVED, STATUS_ACTIVE, \
+    ARCHIVED_ARTICLES_COUNTER
+from webapp.pagination import CursorPaginator, InvalidCursor
+from .base_views import SimpleSearchView, CursorPaginationMixin, ConditionalGetMixin, CacheControlMixin, \
+    SingleFetchMixin, reset_form_instance
 
 
-class IndexView(SimpleSearchView):
+class IndexView(CacheControlMixin, ConditionalGetMixin, CursorPaginationMixin, SimpleSearchView):
     context_object_name = 'articles'
     model = Article
     template_name = 'article/index.html'
     ordering = ['-created_at']
     paginate_by = 5
-    paginate_orphans = 1
+    activity_ordering = ('-last_commented_at', '-pk')
+
+    def get(self, request, *args, **kwargs):
+        self.sort = request.GET.get('sort')
+        return super().get(request, *args, **kwargs)
+
+    def get_validators(self):
+        # лента целиком определяется версиями в кэше - проверка без запросов к БД
+        parts = [caching.get_articles_version(), caching.get_categories_version(),
+                 self.request.GET.urlencode(), self.get_user_key(),
+                 caching.get_read_source(router.db_for_read(Article))]
+        return parts, None
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
-        context['archived_articles'] = self.get_archived_articles()
+        context['archived_count'] = Counter.get_value(ARCHIVED_ARTICLES_COUNTER)
+        context['sort'] = self.sort
+        if self.sort == 'activity':
+            context['query'] = '&'.join(filter(None, [context.get('query'), urlencode({'sort': self.sort})]))
         return context
 
     def get_queryset(self):
-        return super().get_queryset().filter(status=STATUS_ACTIVE)
+        queryset = super().get_queryset().filter(status=STATUS_ACTIVE).select_related('category')
+        if self.sort == 'activity':
+            # статьи без комментариев в ленту активности не попадают
+            queryset = queryset.filter(last_commented_at__isnull=False)
+        return queryset
+
+    def get_cursor_ordering(self):
+        if self.sort == 'activity':
+            return self.activity_ordering
+        return super().get_cursor_ordering()
 
     def get_query(self):
         return Q(title__icontains=self.search_query) \
                | Q(author__icontains=self.search_query)
 
-    def get_archived_articles(self):
-        return super().get_queryset().filter(status=STATUS_ARCHIVED)
+
+class ArchiveView(CursorPaginationMixin, ListView):
+    model = Article
+    template_name = 'article/archive.html'
+    context_object_name = 'articles'
+    paginate_by = 10
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(status=STATUS_ARCHIVED).select_related('category')
+        start, end = self.get_period()
+        if start:
+            queryset = queryset.filter(created_at__gte=start, created_at__lt=end)
+        return queryset
+
+    def get_period(self):
+        year = self.kwargs.get('year')
+        month = self.kwargs.get('month')
+        if year is None:
+            return None, None
+        try:
+            if month is None:
+                start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+            elif month == 12:
+                start, end = datetime(year, 12, 1), datetime(year + 1, 1, 1)
+            else:
+                start, end = datetime(year, month, 1), datetime(year, month + 1, 1)
+        except ValueError:
+            raise Http404('Invalid archive period')
+        return make_aware(start), make_aware(end)
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['year'] = self.kwargs.get('year')
+        context['month'] = self.kwargs.get('month')
+        context['archived_count'] = Counter.get_value(ARCHIVED_ARTICLES_COUNTER)
+        return context
 
 
 class ArticleSearchView(FormView):
@@ -46,21 +116,42 @@ class ArticleSearchView(FormView):
         return redirect(url)
 
 
-class SearchResultsView(ListView):
+class SearchResultsView(CursorPaginationMixin, ListView):
     model = Article
     template_name = 'article/search.html'
     context_object_name = 'articles'
+    ordering = ['-created_at']
     paginate_by = 5
-    paginate_orphans = 2
+    ranked_ordering = ('search_rank', '-created_at', '-pk')
+    search_columns = {
+        'in_title': 'title',
+        'in_text': 'text',
+        'in_tags': 'tags',
+        'in_comment_text': 'comments',
+    }
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        form = FullSearchForm(data=self.request.GET)
+        queryset = super().get_queryset().select_related('category')
+        form = self.search_form = FullSearchForm(data=self.request.GET)
         if form.is_valid():
-            query = self.get_text_query(form) & self.get_author_query(form)
-            queryset = queryset.filter(query).distinct()
+            indexed = self.get_indexed_queryset(queryset, form)
+            if indexed is not None:
+                self.cursor_ordering = self.ranked_ordering
+                queryset = indexed.filter(self.get_author_query(form))
+            else:
+                query = self.get_text_query(form) & self.get_author_query(form)
+                queryset = queryset.filter(query)
+            queryset = queryset.distinct()
         return queryset
 
+    def get_indexed_queryset(self, queryset, form):
+        text = form.cleaned_data.get('text')
+        if not text:
+            return None
+        columns = [column for field, column in self.search_columns.items()
+                   if form.cleaned_data.get(field)]
+        return search.filter_queryset(queryset, text, columns)
+
     def get_context_data(self, *, object_list=None, **kwargs):
         form = FullSearchForm(data=self.request.GET)
         query = self.get_query_string()
@@ -71,7 +162,7 @@ class SearchResultsView(ListView):
     def get_query_string(self):
         data = {}
         for key in self.request.GET:
-            if key != 'page':
+            if key not in (self.cursor_kwarg, SearchExportView.format_kwarg):
                 data[key] = self.request.GET.get(key)
         return urlencode(data)
 
@@ -99,29 +190,140 @@ class SearchResultsView(ListView):
                 query = query | Q(text__icontains=text)
             in_tags = form.cleaned_data.get('in_tags')
             if in_tags:
-                query = query | Q(tags__name__iexact=text)
+                query = query | Q(tags__slug=make_tag_slug(text))
             in_comment_text = form.cleaned_data.get('in_comment_text')
             if in_comment_text:
                 query = query | Q(comments__text__icontains=text)
         return query
 
 
-class ArticleView(DetailView):
+class Echo:
+    """
+    Псевдо-файл для csv.writer: строка не копится в буфере, а сразу
+    возвращается и уходит клиенту.
+    """
+
+    def write(self, value):
+        return value
+
+
+class SearchExportView(SearchResultsView):
+    """
+    Все найденные статьи одним файлом CSV или JSONL. Строки читаются
+    из базы порциями через iterator() и сразу отдаются клиенту,
+    так что память не растёт с размером выгрузки.
+    """
+    format_kwarg = 'format'
+    formats = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+    export_fields = ('pk', 'title', 'author', 'category__name', 'status', 'created_at', 'comment_count', 'text')
+    chunk_size = 500
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(self.format_kwarg, 'csv')
+        if export_format not in self.formats:
+            return HttpResponseBadRequest('Unknown export format')
+        queryset = self.get_queryset()
+        if not self.search_form.is_valid():
+            return HttpResponseBadRequest('Invalid search parameters')
+        rows = queryset.order_by(*self.get_cursor_ordering()) \
+            .values_list(*self.export_fields).iterator(chunk_size=self.chunk_size)
+        lines = self.get_csv_lines(rows) if export_format == 'csv' else self.get_jsonl_lines(rows)
+        response = StreamingHttpResponse(lines, content_type=self.formats[export_format])
+        response['Content-Disposition'] = 'attachment; filename="search.{}"'.format(export_format)
+        return response
+
+    def get_row(self, row):
+        data = dict(zip(self.export_fields, row))
+        data['category'] = data.pop('category__name')
+        data['created_at'] = data['created_at'].isoformat()
+        data['url'] = self.request.build_absolute_uri(reverse('webapp:article_view', kwargs={'pk': data['pk']}))
+        return data
+
+    def get_columns(self):
+        return ['category' if field == 'category__name' else field for field in self.export_fields] + ['url']
+
+    def get_csv_lines(self, rows):
+        writer = csv.writer(Echo())
+        columns = self.get_columns()
+        yield writer.writerow(columns)
+        for row in rows:
+            data = self.get_row(row)
+            yield writer.writerow([data[column] for column in columns])
+
+    def get_jsonl_lines(self, rows):
+        for row in rows:
+            yield json.dumps(self.get_row(row), ensure_ascii=False) + '\n'
+
+
+class ArticleView(CacheControlMixin, ConditionalGetMixin, DetailView):
     template_name = 'article/article.html'
+    body_template_name = 'article/partial/article_body.html'
+    comment_page_template_name = 'article/partial/comment_page.html'
     model = Article
     context_object_name = 'article'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['form'] = ArticleCommentForm()
-        comments = context['article'].comments.order_by('-created_at')
+    def get_validators(self):
+        versions = caching.get_versions(self.kwargs.get(self.pk_url_kwarg))
+        if None in versions:
+            return None, None
+        return versions + [self.request.GET.get('cursor'), self.get_user_key(), self.get_read_source()], None
+
+    def get_read_source(self):
+        return caching.get_read_source(router.db_for_read(Article))
+
+    def get(self, request, *args, **kwargs):
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        cursor = request.GET.get('cursor')
+        versions = caching.get_versions(pk)
+        source = self.get_read_source()
+        fragments = caching.get_fragments(pk, cursor, versions, source)
+        if fragments is None:
+            # версии комментариев и категорий берутся до чтения из БД,
+            # чтобы параллельная запись не оставила в кэше устаревший кусок
+            _, comments_version, categories_version = versions
+            comments_version = caching.get_comments_version(pk, comments_version)
+            categories_version = caching.get_categories_version(categories_version)
+            self.object = self.get_object()
+            versions = [caching.get_article_version(self.object), comments_version, categories_version]
+            fragments = self.render_fragments()
+            caching.set_fragments(pk, cursor, versions, fragments, source)
+        return self.render_to_response(self.get_fragments_context(fragments))
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('category')
+
+    def get_fragments_context(self, fragments):
+        return {
+            'view': self,
+            'article': fragments['article'],
+            'article_body': mark_safe(fragments['body']),
+            'comment_page': mark_safe(fragments['comment_page']),
+            'form': ArticleCommentForm(),
+        }
+
+    def render_fragments(self):
+        context = {'article': self.object}
+        comments = self.object.comments.all()
         self.paginate_comments_to_context(comments, context)
-        return context
+        return {
+            'article': {
+                'pk': self.object.pk,
+                'title': self.object.title,
+                'is_active': self.object.is_active,
+            },
+            'body': render_to_string(self.body_template_name, context),
+            'comment_page': render_to_string(self.comment_page_template_name, context),
+        }
 
     def paginate_comments_to_context(self, comments, context):
-        paginator = Paginator(comments, 3, 0)
-        page_number = self.request.GET.get('page', 1)
-        page = paginator.get_page(page_number)
+        paginator = CursorPaginator(comments, 3)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
         context['paginator'] = paginator
         context['page_obj'] = page
         context['comments'] = page.object_list
@@ -138,29 +340,40 @@ class ArticleCreateView(CreateView):
             return redirect('webapp:accounts:login')
         return super().dispatch(request, *args, **kwargs)
 
+    @retry_on_lock(reset=reset_form_instance)
+    def form_valid(self, form):
+        with transaction.atomic():
+            return super().form_valid(form)
+
     def get_success_url(self):
         return reverse('webapp:article_view', kwargs={'pk': self.object.pk})
 
 
-class ArticleUpdateView(LoginRequiredMixin, UpdateView):
+class ArticleUpdateView(LoginRequiredMixin, SingleFetchMixin, UpdateView):
     model = Article
     template_name = 'article/update.html'
     context_object_name = 'article'
     form_class = ArticleForm
 
+    @retry_on_lock
+    def form_valid(self, form):
+        with transaction.atomic():
+            return super().form_valid(form)
+
     def get_success_url(self):
         return reverse('webapp:article_view', kwargs={'pk': self.object.pk})
 
-class ArticleDeleteView(LoginRequiredMixin, DeleteView):
+
+class ArticleDeleteView(LoginRequiredMixin, SingleFetchMixin, DeleteView):
     model = Article
     template_name = 'article/delete.html'
     context_object_name = 'article'
     success_url = reverse_lazy('webapp:index')
 
     def delete(self, request, *args, **kwargs):
+        # в архив одним update() статуса, без перезаписи всех колонок
         self.object = self.get_object()
-        self.object.status = STATUS_ARCHIVED
-        self.object.save()
+        bulk.archive_articles([self.object.pk])
         return redirect(self.get_success_url())
 
 
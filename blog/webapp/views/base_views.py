@@ -1,10 +1,71 @@
+import hashlib
+from calendar import timegm
+
 from django.db.models import Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404, render, redirect
-from django.utils.http import urlencode
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode, http_date, quote_etag
 from django.views import View
 from django.views.generic import TemplateView, ListView as DjangoListView
 
+from webapp.db import reset_unsaved
 from webapp.forms import SimpleSearchForm
+from webapp.pagination import CursorPaginator, InvalidCursor
+
+
+def reset_form_instance(view, form):
+    """
+    reset для retry_on_lock на form_valid() создающих представлений:
+    повтор сохраняет ту же форму, но как новую строку.
+    """
+    reset_unsaved(form.instance)
+
+
+class SingleFetchMixin:
+    """
+    Объект страницы читается одним запросом и один раз за запрос:
+    get_object() запоминает результат, related_fields подтягиваются
+    через select_related, only_fields ограничивают выбираемые колонки.
+    """
+    related_fields = ()
+    only_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.related_fields:
+            queryset = queryset.select_related(*self.related_fields)
+        if self.only_fields:
+            queryset = queryset.only(*self.only_fields)
+        return queryset
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if getattr(self, '_fetched_object', None) is None:
+            self._fetched_object = super().get_object()
+        return self._fetched_object
+
+    def forget_object(self, *args, **kwargs):
+        """
+        reset для retry_on_lock: повтор записи читает объект заново -
+        после откатившегося delete() у запомненного экземпляра уже pk=None.
+        """
+        self._fetched_object = None
+
+
+class OpenArticleRequiredMixin:
+    """
+    404 для архивной статьи. Ставится после LoginRequiredMixin,
+    чтобы анонимный запрос отправлялся на вход без обращения к базе.
+    Представление обязано определить get_article() - статью со статусом.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.get_article().is_archived:
+            raise Http404
+        return super().dispatch(request, *args, **kwargs)
 
 
 class ListView(TemplateView):
@@ -151,6 +212,92 @@ class DeleteView(View):
         return self.redirect_url
 
 
+class CursorPaginationMixin:
+    cursor_kwarg = 'cursor'
+    cursor_ordering = ('-created_at', '-pk')
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def get_cursor(self):
+        return self.request.GET.get(self.cursor_kwarg)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        try:
+            page = paginator.page(self.get_cursor())
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class ConditionalGetMixin:
+    """
+    Условный GET: до выполнения view считаются валидаторы (ETag и
+    Last-Modified), и если клиент прислал совпадающие If-None-Match /
+    If-Modified-Since, сразу отдаётся 304 без запросов на сам ответ и рендеринга.
+    get_validators() должен вернуть (части ETag или None, datetime или None);
+    если до view валидаторов ещё нет (например, версии не в кэше),
+    они запрашиваются повторно уже после ответа.
+    """
+
+    def get_validators(self):
+        return None, None
+
+    def get_etag(self, parts):
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        parts, last_modified = self.get_validators()
+        etag = self.get_etag(parts) if parts is not None else None
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if etag is None and timestamp is None and response.status_code == 200:
+                parts, last_modified = self.get_validators()
+                etag = self.get_etag(parts) if parts is not None else None
+                timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        if response.status_code in (200, 304):
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if timestamp and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class CacheControlMixin:
+    """
+    Анонимам - public с max-age, чтобы ответ держал кэш перед приложением;
+    вошедшим - private с обязательной проверкой по ETag.
+    """
+
+    def get_user_key(self):
+        """
+        Часть валидатора, зависящая от пользователя: страница вошедшего
+        содержит его имя и CSRF-токен в формах.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return 'anonymous'
+        return '{}:{}:{}'.format(user.pk, user.get_username(),
+                                 self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True,
+                                    max_age=getattr(settings, 'HTML_CACHE_MAX_AGE', 60))
+            patch_vary_headers(response, ['Cookie'])
+        return response
+
+
 class SimpleSearchView(DjangoListView):
     search_form_class = SimpleSearchForm
     form_search_field = 'search'
@@ -1,40 +1,44 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.views.generic import ListView, CreateView, \
     UpdateView, DeleteView
 
+from webapp.db import retry_on_lock
 from webapp.forms import CommentForm, ArticleCommentForm
 from webapp.models import Comment, Article
+from .base_views import CursorPaginationMixin, SingleFetchMixin, OpenArticleRequiredMixin, \
+    reset_form_instance
 
 
-class CommentListView(ListView):
+class CommentListView(CursorPaginationMixin, ListView):
     context_object_name = 'comments'
     model = Comment
     template_name = 'comment/list.html'
     ordering = ['-created_at']
     paginate_by = 10
-    paginate_orphans = 3
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('article')
 
-class CommentForArticleCreateView(LoginRequiredMixin, CreateView):
+
+class CommentForArticleCreateView(LoginRequiredMixin, OpenArticleRequiredMixin, CreateView):
     template_name = 'comment/create.html'
     form_class = ArticleCommentForm
 
-    def dispatch(self, request, *args, **kwargs):
-        self.article = self.get_article()
-        if self.article.is_archived:
-            raise Http404
-        return super().dispatch(request, *args, **kwargs)
-
+    @retry_on_lock
     def form_valid(self, form):
-        self.article.comments.create(**form.cleaned_data)
-        return redirect('webapp:article_view', pk=self.article.pk)
+        article = self.get_article()
+        with transaction.atomic():
+            article.comments.create(**form.cleaned_data)
+        return redirect('webapp:article_view', pk=article.pk)
 
     def get_article(self):
-        article_pk = self.kwargs.get('pk')
-        return get_object_or_404(Article, pk=article_pk)
+        # для проверки статуса и привязки комментария хватает pk и status
+        if not hasattr(self, 'article'):
+            self.article = get_object_or_404(Article.objects.only('status'), pk=self.kwargs.get('pk'))
+        return self.article
 
 
 class CommentCreateView(LoginRequiredMixin, CreateView):
@@ -47,37 +51,48 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
     #     form.fields['article'].queryset = Article.objects.filter(status=STATUS_ACTIVE)
     #     return form
 
+    @retry_on_lock(reset=reset_form_instance)
+    def form_valid(self, form):
+        with transaction.atomic():
+            return super().form_valid(form)
+
     def get_success_url(self):
-        return reverse('webapp:article_view', kwargs={'pk': self.object.article.pk})
+        return reverse('webapp:article_view', kwargs={'pk': self.object.article_id})
 
 
-class CommentUpdateView(LoginRequiredMixin, UpdateView):
+class CommentObjectMixin(LoginRequiredMixin, OpenArticleRequiredMixin, SingleFetchMixin):
+    """
+    Комментарий вместе со статусом его статьи - одним запросом на весь
+    запрос к странице: проверка архива, форма и адрес возврата берут
+    один и тот же объект.
+    """
     model = Comment
-    template_name = 'comment/update.html'
-    form_class = ArticleCommentForm
-    context_object_name = 'comment'
+    related_fields = ('article',)
+    only_fields = ('article', 'article__status', 'author', 'text', 'created_at', 'updated_at')
 
-    def dispatch(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        if self.object.article.is_archived:
-            raise Http404
-        return super().dispatch(request, *args, **kwargs)
+    def get_article(self):
+        return self.get_object().article
 
     def get_success_url(self):
-        return reverse('webapp:article_view', kwargs={'pk': self.object.article.pk})
+        return reverse('webapp:article_view', kwargs={'pk': self.object.article_id})
 
 
-class CommentDeleteView(LoginRequiredMixin, DeleteView):
-    model = Comment
+class CommentUpdateView(CommentObjectMixin, UpdateView):
+    template_name = 'comment/update.html'
+    form_class = ArticleCommentForm
+    context_object_name = 'comment'
+
+    @retry_on_lock
+    def form_valid(self, form):
+        with transaction.atomic():
+            return super().form_valid(form)
 
-    def dispatch(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        if self.object.article.is_archived:
-            raise Http404
-        return super().dispatch(request, *args, **kwargs)
 
+class CommentDeleteView(CommentObjectMixin, DeleteView):
     def get(self, request, *args, **kwargs):
         return self.delete(request, *args, **kwargs)
 
-    def get_success_url(self):
-        return reverse('webapp:article_view', kwargs={'pk': self.object.article.pk})
\ No newline at end of file
+    @retry_on_lock(reset=SingleFetchMixin.forget_object)
+    def delete(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(request, *args, **kwargs)
\ No newline at end of file
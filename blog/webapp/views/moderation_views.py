@@ -0,0 +1,64 @@
+import json
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views import View
+
+from webapp import bulk
+
+
+class BulkModerationView(PermissionRequiredMixin, View):
+    """
+    Массовая операция над списком id для персонала с тем же правом,
+    что и у соответствующего действия админки (permission_required).
+    id принимаются JSON-телом {"ids": [...]} (только целые числа JSON)
+    или повторяющимся полем формы ids (только десятичные цифры).
+    """
+    http_method_names = ['post']
+    raise_exception = True
+    operation = None
+    max_ids = 10000
+
+    def has_permission(self):
+        return self.request.user.is_staff and super().has_permission()
+
+    def post(self, request, *args, **kwargs):
+        try:
+            ids = self.get_ids()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        return JsonResponse({'affected': self.operation(ids)})
+
+    def get_ids(self):
+        if self.request.content_type == 'application/json':
+            try:
+                ids = json.loads(self.request.body.decode()).get('ids')
+            except (AttributeError, UnicodeDecodeError, json.JSONDecodeError):
+                raise ValueError('Invalid JSON body')
+        else:
+            ids = self.request.POST.getlist('ids')
+        if not isinstance(ids, list) or not ids:
+            raise ValueError('No ids provided')
+        if len(ids) > self.max_ids:
+            raise ValueError('Too many ids, at most {} per request'.format(self.max_ids))
+        # int() молча принял бы true, 1.9 и "7" - берём только настоящие целые
+        if self.request.content_type != 'application/json':
+            ids = [int(pk) if pk.isascii() and pk.isdigit() else pk for pk in ids]
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise ValueError('ids should be integers')
+        return ids
+
+
+class ArticleArchiveView(BulkModerationView):
+    permission_required = 'webapp.change_article'
+    operation = staticmethod(bulk.archive_articles)
+
+
+class ArticleUnarchiveView(BulkModerationView):
+    permission_required = 'webapp.change_article'
+    operation = staticmethod(bulk.unarchive_articles)
+
+
+class CommentBulkDeleteView(BulkModerationView):
+    permission_required = 'webapp.delete_comment'
+    operation = staticmethod(bulk.delete_comments)
@@ -0,0 +1,52 @@
+from django.shortcuts import get_object_or_404
+from django.views.generic import ListView, TemplateView
+
+from webapp import caching
+from webapp.models import Article, Tag, STATUS_ACTIVE
+from .base_views import CursorPaginationMixin
+
+
+class TagView(CursorPaginationMixin, ListView):
+    """
+    Активные статьи с тегом. Страницы листаются по связующей таблице:
+    условие tag_id = ? AND id < ? идёт по её индексу на tag_id без
+    сортировки, а статус каждой строки проверяется поиском статьи
+    по первичному ключу.
+    """
+    template_name = 'tag/view.html'
+    paginate_by = 5
+    cursor_ordering = ('-pk',)
+
+    def get_queryset(self):
+        self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
+        return Article.tags.through.objects.filter(tag=self.tag, article__status=STATUS_ACTIVE) \
+            .select_related('article__category')
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['tag'] = self.tag
+        context['articles'] = [tagged.article for tagged in context['object_list']]
+        return context
+
+
+class TagCloudView(TemplateView):
+    """
+    Облако тегов из поддерживаемых сигналами счётчиков Tag.article_count;
+    список кэшируется до следующего изменения тегов.
+    """
+    template_name = 'tag/cloud.html'
+    size = 100
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tags'] = sorted(self.get_tags(), key=lambda tag: tag['name'].lower())
+        return context
+
+    def get_tags(self):
+        version = caching.get_tags_version()
+        tags = caching.get_tag_cloud(version)
+        if tags is None:
+            tags = list(Tag.objects.filter(article_count__gt=0).order_by('-article_count', 'name')
+                        .values('name', 'slug', 'article_count')[:self.size])
+            caching.set_tag_cloud(version, tags)
+        return tags